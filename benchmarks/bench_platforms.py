@@ -0,0 +1,95 @@
+# wall time, requests, throughput and peak memory of each downloader against local stand-ins of the platforms
+#   python benchmarks/bench_platforms.py [--platforms gzctf,cyberpeace,ret2shell,nu1l] [--rounds N] [mock platform options] [-- downloader options]
+# e.g. python benchmarks/bench_platforms.py --challenges 200 --latency 50 --bandwidth 20M -- -j 4
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from mock_platforms import RACE_ID, add_mock_arguments, create_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLATFORMS = {
+    'gzctf': ('gzctf_attachment_downloader.py', '/games/1'),
+    'cyberpeace': ('cyberpeace_attachment_downloader.py', f'/page/mg/ct/contest/flag/{RACE_ID}/ContestPage'),
+    'ret2shell': ('ret2shell_attachment_downloader.py', '/games/1'),
+    'nu1l': ('nu1l_ctfpunk_attachment_downloader.py', ''),
+}
+
+
+def get_saved_size(directory: str):
+    total = 0
+    for root, _, files in os.walk(directory):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files if name.startswith('attachment_'))
+    return total
+
+
+def run_downloader(args, server, platform: str, directory: str, log):
+    script, path = PLATFORMS[platform]
+    command = [sys.executable, os.path.join(ROOT, script),
+               '-u', f'http://127.0.0.1:{server.server_address[1]}{path}', '-t', 'benchmark',
+               '-d', os.path.join(directory, platform), '--cache-dir', os.path.join(directory, 'cache', platform),
+               '--index', os.path.join(directory, 'index.sqlite'),
+               *args.downloader_args]
+    server.platforms.reset_stats()
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, cwd=directory)
+    # wait4 gives the resource usage of this one child, ru_maxrss is in KB on Linux
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    elapsed = time.perf_counter() - started
+    return process.returncode, elapsed, dict(server.platforms.stats), usage.ru_maxrss * 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the downloaders against local stand-ins of the platforms and report how they did.',
+                                     epilog='arguments after "--" are passed to every downloader, e.g. -- -j 4 --segments 4')
+    parser.add_argument('--platforms', type=str, default=','.join(PLATFORMS), help=f'comma separated platforms to run, default is {",".join(PLATFORMS)}')
+    parser.add_argument('--rounds', type=int, default=1, help='runs of each downloader into the same directory, later ones measure an update of an existing download, default is 1')
+    parser.add_argument('--directory', type=str, default=None, help='where to create the temporary directory the downloaders write to, default is the system temporary directory')
+    add_mock_arguments(parser)
+    argv = sys.argv[1:]
+    split = argv.index('--') if '--' in argv else len(argv)
+    args = parser.parse_args(argv[:split])
+    args.downloader_args = argv[split + 1:]
+
+    platforms = [platform.strip() for platform in args.platforms.split(',') if platform.strip()]
+    for platform in platforms:
+        if platform not in PLATFORMS:
+            parser.error(f'unknown platform: {platform}')
+
+    server = create_server(args)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    expected = sum(chall.attachment.size for chall in server.platforms.challenges.values())
+    print(f'{args.challenges} challenges, {expected / 1024 ** 2:.1f} MB of attachments, {args.latency:g} ms latency, '
+          f'bandwidth {f"{args.bandwidth / 1024 ** 2:g} MB/s" if args.bandwidth else "unlimited"}, downloader options: {" ".join(args.downloader_args) or "none"}')
+    print(f'{"platform".ljust(14)} {"round":>5} {"wall s":>8} {"requests":>9} {"conns":>6} {"304":>5} {"MB":>8} {"MB/s":>8} {"peak RSS MB":>12}')
+
+    failed = False
+    try:
+        with tempfile.TemporaryDirectory(dir=args.directory, prefix='bench_platforms_') as directory:
+            for platform in platforms:
+                for round in range(1, args.rounds + 1):
+                    with open(os.path.join(directory, f'{platform}-{round}.log'), 'wb') as log:
+                        code, elapsed, stats, peak_rss = run_downloader(args, server, platform, directory, log)
+                    megabytes = stats['bytes_sent'] / 1024 ** 2
+                    print(f'{platform.ljust(14)} {round:>5} {elapsed:>8.2f} {stats["requests"]:>9} {stats["connections"]:>6} {stats["not_modified"]:>5} '
+                          f'{megabytes:>8.1f} {megabytes / elapsed:>8.1f} {peak_rss / 1024 ** 2:>12.1f}')
+                    saved = get_saved_size(os.path.join(directory, platform))
+                    if code != 0 or saved != expected:
+                        failed = True
+                        print('❌', f'{platform} exited with {code} and saved {saved:,} of {expected:,} bytes, the end of its output:')
+                        with open(log.name, 'r', encoding='utf-8', errors='replace') as f:
+                            print(f.read()[-4000:])
+    finally:
+        server.shutdown()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
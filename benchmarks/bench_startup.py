@@ -0,0 +1,86 @@
+# time from starting ctf-collect until it has shown the help or rejected its arguments, which must not wait for the HTTP stack
+#   python benchmarks/bench_startup.py [--platforms gzctf,cyberpeace,ret2shell,nu1l] [--rounds N] [--budget MS]
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLATFORMS = ['gzctf', 'cyberpeace', 'ret2shell', 'nu1l']
+
+# none of these may be imported before the arguments have been parsed
+HEAVY_MODULES = ['requests', 'urllib3', 'httpx', 'h2', 'certifi', 'sqlite3', 'ctf_collect.session', 'ctf_collect.download', 'ctf_collect.index', 'ctf_collect.mirror']
+
+# modules the interpreter had loaded at startup, e.g. by a .pth file in site-packages, do not count
+CHECK_MODULES = '''
+import sys
+loaded = set(sys.modules)
+from ctf_collect.cli import main
+try:
+    main(sys.argv[1:])
+except SystemExit:
+    pass
+print(' '.join(name for name in {modules!r} if name in sys.modules and name not in loaded), file=sys.stderr)
+'''
+
+
+def time_command(command: list, rounds: int):
+    # the median of wall times, the first run only warms up the file system cache and the bytecode
+    subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=ROOT)
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=ROOT)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000
+
+
+def get_heavy_modules(argv: list):
+    command = [sys.executable, '-c', CHECK_MODULES.format(modules=HEAVY_MODULES), *argv]
+    # the last line of stderr, after the usage and the error argparse may print there
+    process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, cwd=ROOT, text=True)
+    return process.stderr.splitlines()[-1].split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time "ctf-collect <platform> -h" and an argument error against a bare interpreter, and check that no HTTP module is imported for them.')
+    parser.add_argument('--platforms', type=str, default=','.join(PLATFORMS), help=f'comma separated platforms to run, default is {",".join(PLATFORMS)}')
+    parser.add_argument('--rounds', type=int, default=10, help='runs of every command, the median is reported, default is 10')
+    parser.add_argument('--budget', type=float, default=100.0, help='max milliseconds a command may take beyond "python -c pass", default is 100.0')
+    args = parser.parse_args()
+
+    platforms = [platform.strip() for platform in args.platforms.split(',') if platform.strip()]
+    for platform in platforms:
+        if platform not in PLATFORMS:
+            parser.error(f'unknown platform: {platform}')
+
+    baseline = time_command([sys.executable, '-c', 'pass'], args.rounds)
+    print(f'python -c pass: {baseline:.1f} ms, budget {args.budget:g} ms on top of it')
+    print(f'{"command".ljust(40)} {"ms":>8} {"+ms":>8}  imported')
+
+    cases = [['-h'], ['search', '-h'], ['index', 'add', '-h'], ['verify', '-h'], ['serve', '-h']]
+    for platform in platforms:
+        cases += [[platform, '-h'], [platform, '--no-such-option'], [platform, '--retries', 'x']]
+    failed = False
+    for argv in cases:
+        elapsed = time_command([sys.executable, '-m', 'ctf_collect', *argv], args.rounds)
+        heavy = get_heavy_modules(argv)
+        print(f'{" ".join(["ctf-collect", *argv]).ljust(40)} {elapsed:>8.1f} {elapsed - baseline:>8.1f}  {", ".join(heavy) or "-"}')
+        if elapsed - baseline > args.budget or heavy:
+            failed = True
+
+    # for comparison: what a run pays once the platform module is imported
+    for platform in platforms:
+        elapsed = time_command([sys.executable, '-c', f'import ctf_collect.platforms.{platform}'], args.rounds)
+        print(f'{f"import ctf_collect.platforms.{platform}".ljust(40)} {elapsed:>8.1f} {elapsed - baseline:>8.1f}')
+
+    if failed:
+        print('❌', f'a command took more than {args.budget:g} ms beyond the bare interpreter, or imported the HTTP stack before parsing its arguments')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
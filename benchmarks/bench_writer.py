@@ -0,0 +1,108 @@
+# CPU time per GB of the attachment write path: iter_content() chunks vs write_body() with its adaptive chunk size
+#   python benchmarks/bench_writer.py [--size MB] [--rounds N] [--directory DIR]
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ctf_collect.writer import preallocate, write_body   # noqa: E402
+
+SERVER = '''
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+body = bytes(range(256)) * (int(sys.argv[1]) * 4096)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+print(server.server_address[1], flush=True)
+server.serve_forever()
+'''
+
+
+class NullTransfer:
+    def update(self, length):
+        pass
+
+
+def iter_content_path(session, url, path, sha256):
+    # the write path before the shared writer
+    with session.get(url, stream=True) as response, open(path, 'wb') as fp:
+        for chunk in response.iter_content(chunk_size=65536):
+            if chunk:
+                fp.write(chunk)
+                if sha256 is not None:
+                    sha256.update(chunk)
+
+
+def writer_path(session, url, path, sha256):
+    with session.get(url, stream=True) as response, open(path, 'wb') as fp:
+        preallocate(fp, int(response.headers['Content-Length']))
+        write_body(response, fp, NullTransfer(), sha256)
+
+
+def measure(func, session, url, path, rounds, hashed):
+    cpu = []
+    for _ in range(rounds):
+        if os.path.exists(path):
+            os.remove(path)
+        sha256 = hashlib.sha256() if hashed else None
+        started = time.process_time()
+        func(session, url, path, sha256)
+        cpu.append(time.process_time() - started)
+    with open(path, 'rb') as f:
+        digest = hashlib.file_digest(f, 'sha256').hexdigest()
+    return min(cpu), digest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the CPU time per GB of the two attachment write paths.')
+    parser.add_argument('--size', type=int, default=512, help='size of the served body in MB, default is 512')
+    parser.add_argument('--rounds', type=int, default=3, help='rounds per write path, the fastest one counts, default is 3')
+    parser.add_argument('--no-hash', action='store_true', help='if specified, leave out the SHA-256 both paths compute, to compare the copying alone')
+    parser.add_argument('--directory', type=str, default=None, help='where to write the downloaded file, default is a temporary directory')
+    args = parser.parse_args()
+
+    server = subprocess.Popen([sys.executable, '-c', SERVER, str(args.size)], stdout=subprocess.PIPE, text=True)
+    try:
+        url = f'http://127.0.0.1:{server.stdout.readline().strip()}/attachment.bin'
+        session = requests.Session()
+        with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+            path = os.path.join(directory, 'attachment.bin')
+            results = {}
+            for name, func in [('iter_content', iter_content_path), ('write_body', writer_path)]:
+                results[name] = measure(func, session, url, path, args.rounds, not args.no_hash)
+
+        if len({digest for _, digest in results.values()}) != 1:
+            print('❌', 'the write paths produced different files')
+            sys.exit(1)
+        gigabytes = args.size / 1024
+        for name, (cpu, _) in results.items():
+            print(f'{name.ljust(14)} {cpu / gigabytes:.3f} s CPU per GB')
+        saved = (results['iter_content'][0] - results['write_body'][0]) / gigabytes
+        print(f'{"saved".ljust(14)} {saved:.3f} s CPU per GB ({saved * gigabytes / results["iter_content"][0]:.0%})')
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+# a local stand-in for the GZ::CTF, CyberPeace, Ret2Shell and Nu1L CTFPunk APIs the downloaders use,
+# with made-up challenges, adjustable latency, bandwidth and attachment sizes
+#   python benchmarks/mock_platforms.py [--port PORT] [--challenges N] [--latency MS] [--bandwidth SPEED] [--file-size SIZE] [--distribution {fixed,uniform,lognormal}]
+#
+#   GZ::CTF     http://127.0.0.1:PORT/games/1
+#   CyberPeace  http://127.0.0.1:PORT/page/mg/ct/contest/flag/0123456789abcdef0123456789abcdef/ContestPage
+#   Ret2Shell   http://127.0.0.1:PORT/games/1
+#   Nu1L        http://127.0.0.1:PORT
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ctf_collect.limit import TokenBucket   # noqa: E402
+from ctf_collect.options import parse_speed   # noqa: E402
+
+GAME_TITLE = 'Mock Game'
+RACE_ID = '0123456789abcdef0123456789abcdef'
+CATEGORIES = ['Misc', 'Crypto', 'Pwn', 'Web', 'Reverse']
+LAST_MODIFIED = 'Mon, 01 Jan 2024 00:00:00 GMT'
+BLOCK_SIZE = 64 * 1024
+
+
+def get_file_sizes(count: int, size: int, distribution: str, max_size: int, seed: int):
+    # fixed: every attachment has size bytes, uniform: between 0 and twice size,
+    # lognormal: a few large files among many small ones, with size as the median
+    rng = random.Random(seed)
+    if distribution == 'fixed':
+        sizes = [size] * count
+    elif distribution == 'uniform':
+        sizes = [rng.randint(0, 2 * size) for _ in range(count)]
+    else:
+        sizes = [int(rng.lognormvariate(0, 1.5) * size) for _ in range(count)]
+    return [max(1, min(s, max_size)) for s in sizes]
+
+
+class Attachment:
+    # the bytes are a repeated block, generated on the fly, so large files take no memory
+
+    def __init__(self, id: int, size: int):
+        self.id = id
+        self.size = size
+        self.name = f'attachment_{id}.zip'
+        self.block = hashlib.sha256(str(id).encode()).digest() * (BLOCK_SIZE // 32)
+        sha256 = hashlib.sha256()
+        for start in range(0, size, BLOCK_SIZE):
+            sha256.update(self.read(start, min(BLOCK_SIZE, size - start)))
+        self.sha256 = sha256.hexdigest()
+        self.etag = f'"{self.sha256[:16]}"'
+
+    def read(self, start: int, length: int):
+        offset = start % BLOCK_SIZE
+        data = self.block[offset:] + self.block * ((offset + length) // BLOCK_SIZE)
+        return data[:length]
+
+
+class Challenge:
+
+    def __init__(self, id: int, size: int):
+        self.id = id
+        self.title = f'chall {id}'
+        self.category = CATEGORIES[(id - 1) % len(CATEGORIES)]
+        self.description = f'Description of challenge {id}.\n'
+        self.attachment = Attachment(id, size)
+
+
+class MockPlatforms:
+
+    def __init__(self, challenges: list, latency: float = 0.0, bandwidth: float = 0.0, validators: bool = True):
+        self.challenges = {chall.id: chall for chall in challenges}
+        self.validators = validators
+        self.latency = latency
+        self.bandwidth_limiter = TokenBucket(bandwidth, bandwidth / 4) if bandwidth > 0 else None
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.reset_stats()
+        self.routes = [
+            # GZ::CTF
+            (r'/api/game/1', self.gzctf_game),
+            (r'/api/game/1/details', self.gzctf_details),
+            (r'/api/game/1/challenges/(\d+)', self.gzctf_challenge),
+            (r'/assets/[0-9a-f]{64}/attachment_(\d+)\.zip', self.attachment),
+            # Ret2Shell
+            (r'/api/game/1/challenge', self.ret2shell_list),
+            (r'/api/game/1/challenge/(\d+)', self.ret2shell_challenge),
+            (r'/api/game/1/challenge/(\d+)/file', self.ret2shell_file),
+            # CyberPeace
+            (rf'/api/ct/web/jeopardy_race/race/{RACE_ID}/base/', self.cyberpeace_base),
+            (rf'/api/ct/web/jeopardy_race/race/{RACE_ID}/checkpoints/', self.cyberpeace_checkpoints),
+            (rf'/api/ct/web/jeopardy_race/race/{RACE_ID}/checkpoints/(\d+)/', self.cyberpeace_checkpoint),
+            (r'/media/attachment_(\d+)\.zip', self.attachment),
+            # Nu1L CTFPunk
+            (r'/api/competitions/converter:code2id', self.nu1l_code2id),
+            (r'/api/competitions/p1', self.nu1l_competition),
+            (r'/api/competitions/p1/challenges', self.nu1l_challenges),
+            (r'/api/competitions/p1/challenges/(\d+)', self.nu1l_challenge),
+            (r'/api/competitions/p1/challenges/(\d+)/attachments:download', self.attachment),
+        ]
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats.update(requests=0, connections=0, bytes_sent=0, not_modified=0)
+
+    def count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.stats[name] += amount
+
+    # GZ::CTF
+
+    def gzctf_game(self, handler):
+        # Ret2Shell asks the same URL for the game and reads its name
+        return {'title': GAME_TITLE, 'name': GAME_TITLE}
+
+    def gzctf_details(self, handler):
+        challenges = {}
+        for chall in self.challenges.values():
+            challenges.setdefault(chall.category, []).append({'id': chall.id, 'title': chall.title, 'category': chall.category})
+        return {'challenges': challenges}
+
+    def gzctf_challenge(self, handler, id):
+        chall = self.challenges[int(id)]
+        return {'id': chall.id, 'title': chall.title, 'category': chall.category, 'content': chall.description, 'type': 'StaticAttachment',
+                'context': {'url': f'/assets/{chall.attachment.sha256}/{chall.attachment.name}', 'fileSize': chall.attachment.size}}
+
+    # Ret2Shell
+
+    def ret2shell_list(self, handler):
+        return [[{'id': chall.id, 'name': chall.title, 'tag': [{'name': chall.category, 'primary': True}]} for chall in self.challenges.values()]]
+
+    def ret2shell_challenge(self, handler, id):
+        chall = self.challenges[int(id)]
+        return {'name': chall.title, 'content': chall.description, 'tag': [{'name': chall.category, 'primary': True}]}
+
+    def ret2shell_file(self, handler, id):
+        chall = self.challenges[int(id)]
+        if not urlsplit(handler.path).query:
+            return [{'file': chall.attachment.name, 'bucket': 'attachments'}]
+        return self.attachment(handler, id)
+
+    # CyberPeace
+
+    def cyberpeace_base(self, handler):
+        return {'data': {'race_name': GAME_TITLE}}
+
+    def cyberpeace_checkpoints(self, handler):
+        return {'data': {'list': [{'resource_id': chall.id, 'name': chall.title, 'direction': chall.category} for chall in self.challenges.values()]}}
+
+    def cyberpeace_checkpoint(self, handler, id):
+        chall = self.challenges[int(id)]
+        return {'data': {'name': chall.title, 'desc': chall.description, 'attachment': {'url': f'/media/{chall.attachment.name}', 'name': chall.attachment.name}}}
+
+    # Nu1L CTFPunk
+
+    def nu1l_code2id(self, handler):
+        return {'data': {'id': 'p1'}}
+
+    def nu1l_competition(self, handler):
+        return {'data': {'title': GAME_TITLE}}
+
+    def nu1l_challenges(self, handler):
+        return {'data': {'challenges': [{'id': chall.id, 'name': chall.title, 'categories': [chall.category]} for chall in self.challenges.values()]}}
+
+    def nu1l_challenge(self, handler, id):
+        chall = self.challenges[int(id)]
+        return {'data': {'title': chall.title, 'categories': [chall.category], 'description': chall.description,
+                         'attachment': {'filename': chall.attachment.name, 'size': chall.attachment.size}}}
+
+    # attachments, with the conditional and range requests the downloaders make
+
+    def attachment(self, handler, id):
+        attachment = self.challenges[int(id)].attachment
+        if self.validators and handler.headers.get('If-None-Match') == attachment.etag:
+            self.count('not_modified')
+            handler.send_empty(304, ETag=attachment.etag)
+            return None
+
+        start, end, status = 0, attachment.size - 1, 200
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', handler.headers.get('Range', ''))
+        if match and handler.headers.get('If-Range') in (None, attachment.etag, LAST_MODIFIED):
+            start, status = int(match[1]), 206
+            end = min(int(match[2]) if match[2] else end, end)
+            if start > end:
+                handler.send_empty(416, **{'Content-Range': f'bytes */{attachment.size}'})
+                return None
+
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/octet-stream')
+        handler.send_header('Content-Disposition', f'attachment; filename="{attachment.name}"')
+        handler.send_header('Content-Length', str(end - start + 1))
+        handler.send_header('Accept-Ranges', 'bytes')
+        if self.validators:
+            handler.send_header('ETag', attachment.etag)
+            handler.send_header('Last-Modified', LAST_MODIFIED)
+        if status == 206:
+            handler.send_header('Content-Range', f'bytes {start}-{end}/{attachment.size}')
+        handler.end_headers()
+        if handler.command == 'HEAD':
+            return None
+
+        position = start
+        while position <= end:
+            length = min(BLOCK_SIZE, end + 1 - position)
+            if self.bandwidth_limiter is not None:
+                self.bandwidth_limiter.take(length)
+            handler.wfile.write(attachment.read(position, length))
+            self.count('bytes_sent', length)
+            position += length
+        return None
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, Nagle would hold the body back for a delayed ACK
+    disable_nagle_algorithm = True
+    platforms: MockPlatforms = None
+
+    def setup(self):
+        super().setup()
+        self.platforms.count('connections')
+
+    def log_message(self, *args):
+        pass
+
+    def send_empty(self, status: int, **headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def send_json(self, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.platforms.count('not_modified')
+            self.send_empty(304, ETag=etag)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+        self.platforms.count('bytes_sent', len(body))
+
+    def do_GET(self):
+        self.platforms.count('requests')
+        if self.platforms.latency > 0:
+            time.sleep(self.platforms.latency)
+        path = urlsplit(self.path).path
+        for pattern, route in self.platforms.routes:
+            match = re.fullmatch(pattern, path)
+            if match:
+                try:
+                    data = route(self, *match.groups())
+                except KeyError:
+                    break
+                if data is not None:
+                    self.send_json(data)
+                return
+        self.send_empty(404)
+
+    do_HEAD = do_GET
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # downloaders close connections in the middle of bodies they do not want, and at exit
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def add_mock_arguments(parser):
+    mock_group = parser.add_argument_group('mock platform options')
+    mock_group.add_argument('--challenges', type=int, default=50, help='number of challenges, each with one attachment, default is 50')
+    mock_group.add_argument('--latency', type=float, default=20.0, help='milliseconds the platform waits before answering each request, default is 20')
+    mock_group.add_argument('--bandwidth', type=parse_speed, default=0.0, help='upload speed shared by all responses, e.g. 10M (bytes per second), default is 0 (unlimited)')
+    mock_group.add_argument('--file-size', type=parse_speed, default=256 * 1024, help='attachment size, the median for uniform and lognormal, e.g. 256K, default is 256K')
+    mock_group.add_argument('--max-file-size', type=parse_speed, default=64 * 1024 ** 2, help='largest attachment size, default is 64M')
+    mock_group.add_argument('--distribution', choices=['fixed', 'uniform', 'lognormal'], default='lognormal', help='how attachment sizes spread around "--file-size", default is lognormal')
+    mock_group.add_argument('--no-validators', action='store_true', help='send attachments without ETag and Last-Modified, as some platforms do')
+    mock_group.add_argument('--seed', type=int, default=0, help='seed of the attachment sizes, default is 0')
+
+
+def create_server(args, port: int = 0):
+    sizes = get_file_sizes(args.challenges, int(args.file_size), args.distribution, int(args.max_file_size), args.seed)
+    platforms = MockPlatforms([Challenge(id, size) for id, size in enumerate(sizes, 1)], args.latency / 1000, args.bandwidth, not args.no_validators)
+    handler = type('MockHandler', (Handler,), {'platforms': platforms})
+    server = Server(('127.0.0.1', port), handler)
+    server.platforms = platforms
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve made-up challenges the way the supported CTF platforms do.')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on, default is 8000')
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = create_server(args, args.port)
+    print(f'Serving {args.challenges} challenges on http://127.0.0.1:{server.server_address[1]}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# shared pieces of the platform downloaders
@@ -0,0 +1,3 @@
+from ctf_collect.cli import main
+
+main()
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+from ctf_collect.retry import RetryAdapter
+
+CACHE_MAX_AGE = 30 * 24 * 3600      # entries not used for this long are removed
+
+
+class MetadataCache:
+    # platform API responses, keyed by URL and by who asked for them; tokens themselves are never stored
+
+    def __init__(self, directory: str, ttl: float):
+        self.directory = directory
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.round = f'{os.getpid()}-{time.time()}'
+        self.rounds = 0
+        os.makedirs(directory, exist_ok=True)
+        self.prune()
+
+    def prune(self):
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json') and now - entry.stat().st_mtime > CACHE_MAX_AGE:
+                os.remove(entry.path)
+
+    def start_round(self):
+        # responses fetched before this are revalidated again, e.g. for every poll while watching
+        self.round = f'{os.getpid()}-{time.time()}'
+        self.rounds += 1
+
+    def get_key(self, request):
+        # the same URL answers differently for different accounts
+        identity = '\n'.join(request.headers.get(name, '') for name in ('Authorization', 'Cookie'))
+        return hashlib.sha256(f'{hashlib.sha256(identity.encode()).hexdigest()}\n{request.url}'.encode()).hexdigest()
+
+    def get(self, key: str):
+        with self.lock:
+            if key not in self.entries:
+                try:
+                    with open(os.path.join(self.directory, f'{key}.json'), 'r', encoding='utf-8') as f:
+                        self.entries[key] = json.load(f)
+                except (OSError, ValueError):
+                    return None
+            return self.entries[key]
+
+    def is_fresh(self, entry: dict):
+        if entry['round'] == self.round:
+            return True
+        # the ttl spares the requests at the start of a run, later polls have to see new releases
+        return self.rounds <= 1 and time.time() - entry['fetched'] < self.ttl
+
+    def put(self, key: str, entry: dict):
+        entry['round'] = self.round
+        entry['fetched'] = time.time()
+        path = os.path.join(self.directory, f'{key}.json')
+        with self.lock:
+            self.entries[key] = entry
+            with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(f'{path}.tmp', path)
+
+
+def build_response(request, entry: dict):
+    response = requests.Response()
+    response.status_code = 200
+    response.reason = 'OK'
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    response._content = entry['body'].encode('utf-8')
+    response.encoding = 'utf-8'
+    response.url = request.url
+    response.request = request
+    return response
+
+
+class CachingAdapter(RetryAdapter):
+    # answers repeated GETs of challenge info from the cache, and asks the platform "changed since?" for older ones;
+    # streamed requests are attachments and go straight through
+
+    def __init__(self, args, cache: MetadataCache, **kwargs):
+        self.cache = cache
+        super().__init__(args, **kwargs)
+
+    def send(self, request, stream=False, **kwargs):
+        if request.method != 'GET' or stream:
+            return super().send(request, stream=stream, **kwargs)
+
+        key = self.cache.get_key(request)
+        entry = self.cache.get(key)
+        if entry is not None:
+            if self.cache.is_fresh(entry):
+                self.args.metrics.inc('cache_requests_total', result='hit')
+                return build_response(request, entry)
+            if entry['headers'].get('ETag'):
+                request.headers['If-None-Match'] = entry['headers']['ETag']
+            if entry['headers'].get('Last-Modified'):
+                request.headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+
+        response = super().send(request, stream=stream, **kwargs)
+        if response.status_code != 304 or entry is None:
+            self.args.metrics.inc('cache_requests_total', result='miss')
+        if response.status_code == 304 and entry is not None:
+            response.content    # read the empty body, so the connection goes back to the pool
+            self.args.metrics.inc('cache_requests_total', result='revalidated')
+            self.cache.put(key, entry)
+            return build_response(request, entry)
+        if response.status_code == 200 and 'no-store' not in response.headers.get('Cache-Control', ''):
+            try:
+                body = response.content.decode(response.encoding or 'utf-8')
+            except (UnicodeDecodeError, LookupError):
+                return response
+            headers = {name: response.headers[name] for name in ('Content-Type', 'ETag', 'Last-Modified') if name in response.headers}
+            self.cache.put(key, {'url': request.url, 'headers': headers, 'body': body})
+        return response
+
+
+def create_metadata_cache(args):
+    if args.no_cache:
+        return None
+    return MetadataCache(args.cache_dir, args.cache_ttl)
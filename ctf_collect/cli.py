@@ -0,0 +1,65 @@
+import argparse
+import importlib
+import sys
+from ctf_collect.options import add_index_command_arguments, add_search_arguments, add_serve_arguments, add_verify_directory_arguments
+from ctf_collect.platforms import PLATFORMS, check_common_args
+
+
+def run(args):
+    _, _, check_args = PLATFORMS[args.platform]
+    check_args(args)
+    check_common_args(args)
+    # requests, urllib3 and the rest of the download machinery are only imported once the arguments are fine
+    module = importlib.import_module(f'ctf_collect.platforms.{args.platform}')
+    module.get_challs(args)
+
+
+def run_lazily(target: str):
+    # "module:function", the module is imported when the command runs instead of when the parser is built
+    module, _, function = target.partition(':')
+    return lambda args: getattr(importlib.import_module(module), function)(args)
+
+
+# subcommand -> (description, arguments, run with the parsed arguments)
+COMMANDS = {
+    **{platform: (description, add_arguments, run) for platform, (description, add_arguments, _) in PLATFORMS.items()},
+    'serve': ('Serve downloaded games to teammates on the LAN, who download with "--mirror URL".', add_serve_arguments, run_lazily('ctf_collect.mirror:serve')),
+    'search': ('Search every challenge downloaded so far in the full-text index.', add_search_arguments, run_lazily('ctf_collect.index:search')),
+    'index': ('Add game directories downloaded before the index existed to the full-text index.',
+              lambda parser: add_index_command_arguments(parser, list(PLATFORMS)), run_lazily('ctf_collect.index:add')),
+    'verify': ('Rehash downloaded game directories against their manifests, without asking the platform.', add_verify_directory_arguments, run_lazily('ctf_collect.verify:verify')),
+}
+
+
+def add_command_parser(subparsers, command: str, argv: list):
+    description, add_arguments, _ = COMMANDS[command]
+    parser = subparsers.add_parser(command, help=description, description=description)
+    # only the command that is run gets its arguments, seventy or so for a platform, the others are just listed in the help
+    if argv[:1] == [command]:
+        add_arguments(parser)
+    if command in PLATFORMS:
+        parser.set_defaults(platform=command)
+
+
+def main(argv: list = None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(prog='ctf-collect', description='Download the challenges and attachments of a CTF game.')
+    subparsers = parser.add_subparsers(dest='command', required=True, metavar='COMMAND')
+    for command in COMMANDS:
+        add_command_parser(subparsers, command, argv)
+    args = parser.parse_args(argv)
+    _, _, run_command = COMMANDS[args.command]
+    run_command(args)
+
+
+def main_platform(platform: str, argv: list = None):
+    # the *_attachment_downloader.py scripts, which take the arguments of one platform without a subcommand
+    description, add_arguments, _ = PLATFORMS[platform]
+    parser = argparse.ArgumentParser(description=description)
+    add_arguments(parser)
+    parser.set_defaults(platform=platform)
+    run(parser.parse_args(argv))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ctf_collect.extract import submit_extract
+from ctf_collect.index import index_description, index_file
+from ctf_collect.jobs import print
+from ctf_collect.metrics import count_bytes, count_file
+from ctf_collect.mirror import get_mirror_entry, get_mirror_headers, is_mirrored, open_mirror
+from ctf_collect.progress import start_transfer
+from ctf_collect.retry import PERMANENT_ERRORS, TRANSIENT_ERRORS, get_retry_delay
+from ctf_collect.store import add_blob, get_blob_path, has_blob, link_blob
+from ctf_collect.trace import label_request
+from ctf_collect.verify import hash_file
+from ctf_collect.writer import preallocate, write_body
+
+
+def get_content_size(response):
+    # total size from a partial response's Content-Range, or Content-Length of a full one, -1 if unknown
+    size = int(response.headers.get('Content-Range', '0-0/-1').split('/')[-1])
+    if size == -1:
+        try:
+            size = int(response.headers['Content-Length'])
+        except (KeyError, ValueError):
+            size = -1
+    return size
+
+
+def get_content_file_name(response, default: str):
+    content_disposition = response.headers.get('Content-Disposition', '')
+    if 'filename=' not in content_disposition:
+        return default
+    return content_disposition.split('filename=')[1] \
+                              .split(';')[0] \
+                              .strip('"')
+
+
+def open_attachment(args, session, url: str, title: str, key: str = None, sha256: str = None):
+    # one streaming request gives size and name, the body is only read later if the file is wanted;
+    # attachments from the manifest are asked conditionally, so unchanged ones transfer no body
+    headers = {} if args.overwrite else args.manifest.get_conditional_headers(key or url)
+    # one not here yet is taken from the mirror if the platform still has the version the mirror got,
+    # which it tells by the sha256 in advance or by a 304 to the validators of the mirror's copy
+    mirror_entry = None if headers or args.plan is not None else get_mirror_entry(args, key or url)
+    # a dry run only needs size and name, so it does not open a body it would have to drop
+    method = 'GET' if args.plan is None else 'HEAD'
+    response = None
+    if mirror_entry is not None and sha256 is not None and mirror_entry.get('sha256') == sha256:
+        response = open_mirror(args, url, mirror_entry)
+    if response is None:
+        label_request(args, url, title)
+        response = session.request(method, url, headers=headers or get_mirror_headers(mirror_entry), stream=True)
+        label_request(args, response.url, title)     # segments and resumes ask the redirected URL
+        if response.status_code == 304 and mirror_entry is not None and not headers:
+            # the platform has not changed it since the mirror got it
+            response.content
+            response.close()
+            response = open_mirror(args, url, mirror_entry) or session.get(url, stream=True)
+
+    if response.status_code == 304:
+        response.content    # read the empty body, so the connection goes back to the pool instead of being closed
+        response.close()
+        count_file(args, title, 'not_modified')
+        print('⏩', title.ljust(24), 'not modified since last run')
+        return None
+
+    if response.status_code not in (200, 206):
+        response.close()
+        count_file(args, title, 'failed')
+        print('❌', title.ljust(24), f'Failed to get attachment from {url}, status code: {response.status_code}')
+        return None
+
+    size = get_content_size(response)
+    if size != -1 and size > args.max_size:
+        response.close()
+        count_file(args, title, 'too_large')
+        print('🤯', title.ljust(24), f'is too large ({format(size, ",")} bytes)')
+        return None
+
+    return response
+
+
+def get_validator(response):
+    # If-Range only accepts a strong validator, so weak ETags fall back to Last-Modified
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+
+def read_part_info(part_path: str):
+    try:
+        with open(f'{part_path}.json', 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_part_info(part_path: str, part_info: dict):
+    with open(f'{part_path}.json', 'w', encoding='utf-8') as f:
+        json.dump(part_info, f)
+
+
+def open_part_file(session, response, part_path: str):
+    # continue a partial download of the same remote version, otherwise start over with this response
+    validator = get_validator(response)
+    part_info = read_part_info(part_path)
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    # a preallocated file is longer than what has been written to it
+    offset = min(offset, part_info.get('written', offset))
+
+    if offset and validator is not None and part_info.get('validator') == validator and 'segments' not in part_info:
+        response.close()
+        response = session.get(response.url, headers={'Range': f'bytes={offset}-', 'If-Range': validator}, stream=True)
+        content_range = re.match(r'bytes (\d+)-', response.headers.get('Content-Range', ''))
+        if response.status_code == 206 and content_range and int(content_range.group(1)) == offset:
+            fp = open(part_path, 'r+b')
+            fp.truncate(offset)
+            fp.seek(offset)
+            return response, fp, offset
+        if response.status_code != 200:
+            response.close()
+            response = session.get(response.url, stream=True)
+            response.raise_for_status()
+        validator = get_validator(response)
+
+    if validator is not None:
+        write_part_info(part_path, {'validator': validator})
+    elif os.path.exists(f'{part_path}.json'):
+        os.remove(f'{part_path}.json')
+    return response, open(part_path, 'wb'), 0
+
+
+def record_attachment(args, response, local_path: str, got_size: int, key: str, chall_id, sha256: str):
+    args.manifest.record(key,
+                         chall_id=chall_id,
+                         url=key,
+                         path=local_path,
+                         size=got_size,
+                         etag=response.headers.get('ETag'),
+                         last_modified=response.headers.get('Last-Modified'),
+                         sha256=sha256)
+
+
+def download_sequential(args, session, response, part_path: str, size: int, title: str):
+    response, fp, got_size = open_part_file(session, response, part_path)
+    sha256 = hashlib.sha256()
+    if got_size:
+        print('⏯', title.ljust(24), f'resuming from {format(got_size, ",")} bytes')
+        with open(part_path, 'rb') as f:
+            while block := f.read(1 << 20):
+                sha256.update(block)
+
+    part_info = read_part_info(part_path)
+    offset = got_size
+
+    def checkpoint(written: int):
+        if part_info:
+            part_info['written'] = offset + written
+            write_part_info(part_path, part_info)
+
+    transfer = start_transfer(args, title, size, got_size)
+    try:
+        with fp:
+            preallocate(fp, size)
+            try:
+                got_size += write_body(response, fp, transfer, sha256, checkpoint=checkpoint, bandwidth_limiter=args.bandwidth_limiter)
+            finally:
+                # drop the preallocated tail that was never written
+                fp.truncate(fp.tell())
+                checkpoint(fp.tell() - offset)
+    finally:
+        transfer.finish()
+        count_bytes(args, title, transfer.got_size - offset)
+    response.close()
+    return got_size, sha256.hexdigest()
+
+
+def can_segment(args, response, size: int):
+    return args.segments > 1 \
+        and size != -1 \
+        and size >= args.segment_threshold \
+        and response.status_code == 200 \
+        and response.headers.get('Accept-Ranges', '').lower() == 'bytes' \
+        and 'Content-Encoding' not in response.headers
+
+
+def download_segmented(args, session, response, part_path: str, size: int, title: str):
+    # fetch byte ranges of one large file on several connections, each written at its own offset;
+    # every segment is [start, end, next offset to fetch], kept in the .part.json for resuming
+    url = response.url
+    validator = get_validator(response)
+    response.close()
+
+    part_info = read_part_info(part_path)
+    if os.path.exists(part_path) and part_info.get('validator') == validator and validator is not None \
+            and part_info.get('size') == size and 'segments' in part_info:
+        segments = part_info['segments']
+    else:
+        step = -(-size // args.segments)
+        segments = [[start, min(start + step, size), start] for start in range(0, size, step)]
+        with open(part_path, 'wb') as fp:
+            if not preallocate(fp, size):
+                fp.truncate(size)
+    part_info = {'validator': validator, 'size': size, 'segments': segments}
+    write_part_info(part_path, part_info)
+
+    lock = threading.Lock()
+    got_size = sum(offset - start for start, _, offset in segments)
+    if got_size:
+        print('⏯', title.ljust(24), f'resuming from {format(got_size, ",")} bytes')
+
+    def fetch_segment(segment: list):
+        start, end, offset = segment
+        if offset >= end:
+            return
+        headers = {'Range': f'bytes={offset}-{end - 1}'}
+        if validator is not None:
+            headers['If-Range'] = validator
+
+        def checkpoint(written: int):
+            # only record progress that has reached the file
+            with lock:
+                segment[2] = offset + written
+                write_part_info(part_path, part_info)
+
+        with session.get(url, headers=headers, stream=True) as segment_response, open(part_path, 'r+b') as fp:
+            content_range = re.match(r'bytes (\d+)-', segment_response.headers.get('Content-Range', ''))
+            if segment_response.status_code != 206 or not content_range or int(content_range.group(1)) != offset:
+                raise OSError(f'bytes {offset}-{end - 1} were not served as a range, status code: {segment_response.status_code}')
+            fp.seek(offset)
+            written = write_body(segment_response, fp, transfer, limit=end - offset, checkpoint=checkpoint, bandwidth_limiter=args.bandwidth_limiter)
+            fp.flush()
+        checkpoint(written)
+
+    transfer = start_transfer(args, title, size, got_size)
+    try:
+        with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+            futures = [executor.submit(fetch_segment, segment) for segment in segments]
+    finally:
+        transfer.finish()
+        count_bytes(args, title, transfer.got_size - got_size)
+    for future in futures:
+        future.result()
+
+    got_size = sum(offset - start for start, _, offset in segments)
+    if got_size != size:
+        raise OSError(f'got {got_size} bytes of {size}')
+    return got_size, hash_file(part_path)[1]
+
+
+def save_description(args, local_path: str, content: str, title: str):
+    if args.plan is not None:
+        category, chall_name = title.split('/', 1)
+        args.plan.add(kind='description', category=category, chall=chall_name, path=local_path, content=content)
+        return
+    with open(local_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    index_description(args, local_path, content, title)
+
+
+def save_attachment(args, session, response, local_path: str, size: int, title: str, exist_flag: bool, key: str = None, chall_id=None, sha256: str = None):
+    # stream the body of an already opened response into local_path.part, and move it into place
+    # only when complete, so an interrupted download is resumed instead of taken as finished;
+    # sha256 is the content hash if the platform tells it in advance
+    url = response.history[0].url if response.history else response.url
+    platform_url = url
+    mirrored = is_mirrored(args, response)
+    if mirrored:
+        # the rest of the body, retries and segments come from the mirror without the platform's token
+        platform_url = response.platform_url
+        session = args.team_mirror.session
+    key = key or platform_url
+    if args.plan is not None:
+        # a dry run only asked for the headers
+        response.close()
+        category, chall_name = title.split('/', 1)
+        args.plan.add(kind='attachment', category=category, chall=chall_name, url=platform_url, key=key, path=local_path,
+                      size=size, chall_id=chall_id, sha256=sha256)
+        return 0
+
+    if has_blob(args, sha256):
+        # the bytes are already in the store, nothing to transfer or write
+        response.close()
+        link_blob(args, get_blob_path(args, sha256), local_path)
+        got_size = os.path.getsize(local_path)
+        record_attachment(args, response, local_path, got_size, key, chall_id, sha256)
+        index_file(args, local_path, got_size, sha256, key, title)
+        count_file(args, title, 'linked')
+        print('🔗', title.ljust(24), f'linked {local_path} from store ({format(got_size, ",")} bytes)', '[overwritten]' if exist_flag else '')
+        submit_extract(args, local_path, title)
+        return got_size
+
+    part_path = f'{local_path}.part'
+    for attempt in range(1, args.retries + 2):
+        try:
+            if can_segment(args, response, get_content_size(response)):
+                got_size, sha256 = download_segmented(args, session, response, part_path, get_content_size(response), title)
+            else:
+                got_size, sha256 = download_sequential(args, session, response, part_path, size, title)
+            break
+        except PERMANENT_ERRORS:
+            response.close()
+            raise
+        except TRANSIENT_ERRORS as e:
+            response.close()
+            if attempt > args.retries:
+                raise
+            # what reached the .part file is kept, so the next request continues from there
+            delay = get_retry_delay(args, attempt)
+            print('🔁', title.ljust(24), f'download interrupted ({type(e).__name__}), resuming in {delay:.1f} seconds ({attempt}/{args.retries})')
+            time.sleep(delay)
+            response = session.get(url, stream=True)
+            response.raise_for_status()
+
+    if os.path.exists(f'{part_path}.json'):
+        os.remove(f'{part_path}.json')
+    if args.store is not None:
+        link_blob(args, add_blob(args, part_path, sha256), local_path)
+    else:
+        os.replace(part_path, local_path)
+
+    record_attachment(args, response, local_path, got_size, key, chall_id, sha256)
+    index_file(args, local_path, got_size, sha256, key, title)
+    count_file(args, title, 'mirrored' if mirrored else 'downloaded')
+
+    print('✅',
+        title.ljust(24),
+        f'saved to {local_path} ({format(got_size, ",")} bytes{" from mirror" if mirrored else ""})',
+        '[overwritten]' if exist_flag else '')
+    submit_extract(args, local_path, title)
+    return got_size
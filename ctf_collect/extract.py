@@ -0,0 +1,399 @@
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import tarfile
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from ctf_collect.jobs import print
+from ctf_collect.progress import format_size
+from ctf_collect.verify import hash_file
+
+COPY_BLOCK_SIZE = 1 << 20
+
+# longest first, so "a.tar.gz" becomes "a" and not "a.tar"
+ARCHIVE_SUFFIXES = ('.tar.bz2', '.tar.gz', '.tar.xz', '.tbz2', '.tgz', '.txz', '.tar', '.zip', '.bz2', '.gz', '.xz')
+
+# zip containers that are a file to look at rather than an archive to unpack
+CONTAINER_SUFFIXES = ('.apk', '.docx', '.epub', '.jar', '.odt', '.pptx', '.whl', '.xlsx')
+
+STREAMS = {'gzip': gzip.open, 'bzip2': bz2.open, 'xz': lzma.open}
+
+# (offset, magic, type), checked in order
+MAGICS = (
+    (0, b'PK\x03\x04', 'zip'),
+    (0, b'PK\x05\x06', 'zip'),
+    (257, b'ustar', 'tar'),
+    (0, b'\x1f\x8b', 'gzip'),
+    (0, b'BZh', 'bzip2'),
+    (0, b'\xfd7zXZ\x00', 'xz'),
+    (0, b"7z\xbc\xaf'\x1c", '7z'),
+    (0, b'Rar!\x1a\x07', 'rar'),
+    (0, b'\x7fELF', 'ELF'),
+    (0, b'MZ', 'PE'),
+    (0, b'\xcf\xfa\xed\xfe', 'Mach-O'),
+    (0, b'\xca\xfe\xba\xbe', 'Mach-O / Java class'),
+    (0, b'\x00asm', 'WebAssembly'),
+    (0, b'\xd4\xc3\xb2\xa1', 'pcap'),
+    (0, b'\xa1\xb2\xc3\xd4', 'pcap'),
+    (0, b'\x0a\x0d\x0d\x0a', 'pcapng'),
+    (0, b'SQLite format 3\x00', 'SQLite'),
+    (0, b'%PDF', 'PDF'),
+    (0, b'\x89PNG', 'PNG'),
+    (0, b'\xff\xd8\xff', 'JPEG'),
+    (0, b'GIF8', 'GIF'),
+    (0, b'BM', 'BMP'),
+    (0, b'RIFF', 'RIFF (WAV / AVI / WebP)'),
+    (0, b'ID3', 'MP3'),
+    (0, b'fLaC', 'FLAC'),
+    (0, b'OggS', 'Ogg'),
+    (0, b'#!', 'script'),
+)
+
+
+class ExtractLimitError(Exception):
+    pass
+
+
+class Budget:
+    # what is left to unpack from one downloaded archive, shared with the archives nested in it
+
+    def __init__(self, max_size: int, max_files: int):
+        self.size = max_size
+        self.files = max_files
+
+    def take_file(self, declared_size: int):
+        if self.files <= 0:
+            raise ExtractLimitError('too many files')
+        if declared_size > self.size:
+            raise ExtractLimitError('too large')
+        self.files -= 1
+
+    def take_bytes(self, amount: int):
+        # archive headers may lie about sizes, so the bytes actually written count too
+        self.size -= amount
+        if self.size < 0:
+            raise ExtractLimitError('too large')
+
+
+def get_type(path: str):
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(512)
+    except OSError:
+        return 'unreadable'
+    for offset, magic, file_type in MAGICS:
+        if head[offset:offset + len(magic)] == magic:
+            return file_type
+    if not head:
+        return 'empty'
+    if b'\x00' in head:
+        return 'data'
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        if e.start < len(head) - 4:      # not just a character cut off at the end of the head
+            return 'data'
+    return 'text'
+
+
+def get_archive_type(path: str):
+    if path.lower().endswith(CONTAINER_SUFFIXES):
+        return None
+    file_type = get_type(path)
+    if file_type in ('zip', 'tar'):
+        return file_type
+    if file_type in STREAMS:
+        # a compressed tarball, or a single compressed file
+        return 'tar' if tarfile.is_tarfile(path) else file_type
+    return None
+
+
+def get_destination(path: str):
+    for suffix in ARCHIVE_SUFFIXES:
+        if path.lower().endswith(suffix) and len(os.path.basename(path)) > len(suffix):
+            return path[:-len(suffix)]
+    return f'{path}_extracted'
+
+
+def get_safe_target(destination: str, name: str):
+    # None for absolute names, drive letters and anything climbing out with ".."
+    name = name.replace('\\', '/')
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    if not parts or name.startswith('/') or ':' in parts[0] or '..' in parts:
+        return None
+    return os.path.join(destination, *parts)
+
+
+def copy_limited(src, target: str, budget: Budget):
+    try:
+        with open(target, 'wb') as dst:
+            while block := src.read(COPY_BLOCK_SIZE):
+                budget.take_bytes(len(block))
+                dst.write(block)
+    except BaseException:
+        # a member cut short by a limit or a broken archive would look like a complete one
+        if os.path.exists(target):
+            os.remove(target)
+        raise
+
+
+def unpack_zip(path: str, destination: str, budget: Budget, skipped: list):
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            target = get_safe_target(destination, info.filename)
+            if target is None:
+                skipped.append(f'{info.filename} (unsafe path)')
+                continue
+            if info.is_dir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            if info.flag_bits & 0x1:
+                skipped.append(f'{info.filename} (encrypted)')
+                continue
+            budget.take_file(info.file_size)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with archive.open(info) as src:
+                copy_limited(src, target, budget)
+
+
+def unpack_tar(path: str, destination: str, budget: Budget, skipped: list):
+    with tarfile.open(path) as archive:
+        for member in archive:
+            target = get_safe_target(destination, member.name)
+            if target is None:
+                skipped.append(f'{member.name} (unsafe path)')
+                continue
+            if member.isdir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            if not member.isfile():
+                # links may point anywhere, devices and fifos are of no use
+                skipped.append(f'{member.name} (not a regular file)')
+                continue
+            budget.take_file(member.size)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with archive.extractfile(member) as src:
+                copy_limited(src, target, budget)
+
+
+def unpack_stream(path: str, destination: str, archive_type: str, budget: Budget):
+    # a single compressed file, e.g. dump.pcap.gz becomes dump.pcap
+    budget.take_file(0)
+    with STREAMS[archive_type](path, 'rb') as src:
+        copy_limited(src, destination, budget)
+
+
+def unpack(path: str, destination: str, archive_type: str, budget: Budget, skipped: list):
+    if archive_type == 'zip':
+        os.makedirs(destination, exist_ok=True)
+        unpack_zip(path, destination, budget, skipped)
+    elif archive_type == 'tar':
+        os.makedirs(destination, exist_ok=True)
+        unpack_tar(path, destination, budget, skipped)
+    else:
+        unpack_stream(path, destination, archive_type, budget)
+
+
+def remove(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def move_aside(path: str):
+    # what an earlier run unpacked may have notes or solve scripts of a teammate in it, so it is kept as path.old-N
+    n = 1
+    while os.path.exists(f'{path}.old-{n}'):
+        n += 1
+    os.replace(path, f'{path}.old-{n}')
+    return f'{path}.old-{n}'
+
+
+def read_listing_sha256(listing_path: str):
+    # the archive the listing was written for, None for listings without one
+    try:
+        with open(listing_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('sha256: '):
+                    return line[len('sha256: '):].strip()
+                if not line.strip():
+                    return None
+    except OSError:
+        pass
+    return None
+
+
+def list_archive(path: str, archive_type: str):
+    # the members of a nested archive below the unpacked depth
+    try:
+        if archive_type == 'zip':
+            with zipfile.ZipFile(path) as archive:
+                return [(info.file_size, info.filename) for info in archive.infolist() if not info.is_dir()]
+        if archive_type == 'tar':
+            with tarfile.open(path) as archive:
+                return [(member.size, member.name) for member in archive if member.isfile()]
+    except (OSError, zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+        return [(0, f'(unreadable: {e})')]
+    return []
+
+
+def unpack_nested(directory: str, depth: int, budget: Budget, skipped: list, nested: list):
+    # unpack the archives found in a freshly unpacked directory, and the archives in those, up to depth levels
+    for dir_path, _, file_names in os.walk(directory):
+        for file_name in sorted(file_names):
+            path = os.path.join(dir_path, file_name)
+            archive_type = get_archive_type(path)
+            if archive_type is None:
+                continue
+            if depth <= 0:
+                nested.append((path, list_archive(path, archive_type)))
+                continue
+            destination = get_destination(path)
+            if os.path.exists(destination):
+                nested.append((path, list_archive(path, archive_type)))
+                continue
+            try:
+                unpack(path, destination, archive_type, budget, skipped)
+            except (OSError, zipfile.BadZipFile, tarfile.TarError, EOFError, lzma.LZMAError) as e:
+                skipped.append(f'{os.path.relpath(path, directory)} (broken archive: {e})')
+                continue
+            nested.append((path, None))
+            if os.path.isdir(destination):
+                unpack_nested(destination, depth - 1, budget, skipped, nested)
+
+
+def write_listing(listing_path: str, path: str, sha256: str, destination: str, types: Counter, files: list, skipped: list, nested: list, error: str):
+    root = os.path.dirname(destination)
+    with open(listing_path, 'w', encoding='utf-8') as f:
+        f.write(f'{os.path.basename(path)}: {len(files)} files, {format_size(sum(size for size, _, _ in files))} in {os.path.basename(destination)}\n')
+        f.write(f'sha256: {sha256}\n')
+        f.write('types: ' + (', '.join(f'{count} {file_type}' for file_type, count in types.most_common()) or 'none') + '\n')
+        if error:
+            f.write(f'stopped early: {error}\n')
+        f.write('\n')
+        for size, file_type, file_path in files:
+            f.write(f'{size:>14,}  {file_type:<24}  {os.path.relpath(file_path, root)}\n')
+        for nested_path, members in nested:
+            if members is None:
+                continue
+            f.write(f'\nnested archive {os.path.relpath(nested_path, root)}, not unpacked:\n')
+            for size, name in members:
+                f.write(f'{size:>14,}  {name}\n')
+        if skipped:
+            f.write('\nskipped:\n')
+            for name in skipped:
+                f.write(f'  {name}\n')
+
+
+def extract_archive(path: str, max_size: int, max_files: int, depth: int):
+    # runs in a worker process; unpacks path next to it and writes a listing, None if path is no archive
+    archive_type = get_archive_type(path)
+    if archive_type is None:
+        return None
+    destination = get_destination(path)
+    listing_path = f'{destination}.contents.txt'
+    if os.path.exists(destination) and not os.path.exists(listing_path):
+        return {'error': f'{destination} already exists and was not unpacked by an earlier run'}
+    # redownloads and store links of an unchanged archive come here too
+    sha256 = hash_file(path)[1]
+    if os.path.exists(destination) and read_listing_sha256(listing_path) == sha256:
+        return {'destination': destination, 'unchanged': True}
+
+    # unpack beside the old result and swap, so a re-downloaded archive does not mix with its old version
+    staging = f'{destination}.unpacking'
+    remove(staging)
+    budget = Budget(max_size, max_files)
+    skipped, nested = [], []
+    error = None
+    try:
+        unpack(path, staging, archive_type, budget, skipped)
+        unpack_nested(staging, depth, budget, skipped, nested)
+    except ExtractLimitError as e:
+        error = f'{e}, limits are {format_size(max_size)} and {max_files:,} files'
+    except (OSError, zipfile.BadZipFile, tarfile.TarError, EOFError, lzma.LZMAError) as e:
+        remove(staging)
+        return {'error': f'{type(e).__name__}: {e}'}
+
+    moved = move_aside(destination) if os.path.exists(destination) else None
+    if not os.path.exists(staging):
+        os.makedirs(staging)      # nothing was unpacked before a limit was hit
+    os.replace(staging, destination)
+    nested = [(nested_path.replace(staging, destination, 1), members) for nested_path, members in nested]
+    files = [(os.path.getsize(destination), get_type(destination), destination)] if os.path.isfile(destination) else []
+    for dir_path, _, file_names in os.walk(destination):
+        for file_name in sorted(file_names):
+            file_path = os.path.join(dir_path, file_name)
+            files.append((os.path.getsize(file_path), get_type(file_path), file_path))
+    types = Counter(file_type for _, file_type, _ in files)
+    write_listing(listing_path, path, sha256, destination, types, files, skipped, nested, error)
+    return {'destination': destination, 'files': len(files), 'size': sum(size for size, _, _ in files), 'types': dict(types.most_common()),
+            'nested': len(nested), 'skipped': len(skipped), 'error': error, 'moved': moved}
+
+
+class Extractor:
+    # archives are unpacked in other processes while the downloads go on
+
+    def __init__(self, args):
+        self.args = args
+        self.executor = None
+        self.futures = []
+
+    def submit(self, local_path: str, title: str):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.args.extract_workers)
+        future = self.executor.submit(extract_archive, local_path, int(self.args.extract_max_size * 1024 * 1024), self.args.extract_max_files, self.args.extract_depth)
+        future.add_done_callback(lambda future: self.report(future, title))
+        self.futures.append(future)
+
+    def report(self, future, title: str):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {'error': f'{type(e).__name__}: {e}'}
+        if result is None:
+            return
+        if 'destination' not in result:
+            self.args.metrics.inc('archives_total', result='failed')
+            print('❌', title.ljust(24), f'Failed to unpack, error: {result["error"]}')
+            return
+        if result.get('unchanged'):
+            self.args.metrics.inc('archives_total', result='unchanged')
+            print('⏩', title.ljust(24), f'unchanged since it was unpacked to {result["destination"]}')
+            return
+        self.args.metrics.inc('archives_total', result='limited' if result['error'] else 'extracted')
+        types = ', '.join(f'{count} {file_type}' for file_type, count in list(result['types'].items())[:4])
+        print('📂' if not result['error'] else '🤯',
+              title.ljust(24),
+              f'unpacked {result["files"]} files ({format_size(result["size"])}) to {result["destination"]}',
+              f'[{types}]' if types else '',
+              f'[{result["nested"]} nested]' if result['nested'] else '',
+              f'[{result["skipped"]} skipped]' if result['skipped'] else '',
+              f'[stopped: {result["error"]}]' if result['error'] else '',
+              f'[earlier unpack kept as {result["moved"]}]' if result['moved'] else '')
+
+    def finish(self):
+        if self.executor is None:
+            return
+        if any(not future.done() for future in self.futures):
+            print('📂', f'waiting for {sum(not future.done() for future in self.futures)} archives to be unpacked...')
+        self.executor.shutdown(wait=True)
+        self.executor = None
+        self.futures = []
+
+
+def submit_extract(args, local_path: str, title: str):
+    if args.extractor is not None:
+        args.extractor.submit(local_path, title)
+
+
+def finish_extract(args):
+    if args.extractor is not None:
+        args.extractor.finish()
+
+
+def create_extractor(args):
+    return Extractor(args) if args.extract else None
@@ -0,0 +1,199 @@
+import http.client
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import extract_cookies_to_jar
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from ctf_collect.jobs import print
+try:
+    import h2.errors        # httpx only speaks HTTP/2 with it
+    import httpx
+except ImportError:     # optional, HTTP/1.1 through urllib3 is used without them
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+# httpx trace events that are phases of a request trace
+PHASES = {'connection.connect_tcp': 'connect', 'connection.start_tls': 'tls'}
+
+
+def is_http2_available():
+    return httpx is not None
+
+
+def get_timeout(timeout):
+    # requests takes seconds or (connect, read)
+    if isinstance(timeout, tuple):
+        return httpx.Timeout(timeout[1], connect=timeout[0], pool=None)
+    return httpx.Timeout(timeout, pool=None)
+
+
+def reset_stream(response):
+    # httpcore stops reading a stream closed before its end without telling the server, whose data for it
+    # then fills the flow control window of the connection until every other stream on it stalls;
+    # a RST_STREAM makes the server stop sending; this goes through httpcore internals, hence the pinned range in pyproject.toml
+    try:
+        stream = response.stream._stream._httpcore_stream._stream
+        connection = stream._connection
+        with connection._write_lock:
+            connection._h2_state.reset_stream(stream._stream_id, h2.errors.ErrorCodes.CANCEL)
+            connection._network_stream.write(connection._h2_state.data_to_send())
+    except Exception as e:
+        # response.close() still ends the stream on our side, the server just keeps sending until the window is full
+        logger.debug('could not reset the HTTP/2 stream of %s: %r', response.url, e)
+
+
+def get_request_error(e):
+    # the requests exception for an httpx one, so retries and resumes work the same on both transports
+    if isinstance(e, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(e)
+    if isinstance(e, httpx.TimeoutException):
+        return requests.exceptions.ReadTimeout(e)
+    return requests.exceptions.ConnectionError(e)
+
+
+class HTTP2Body:
+    # an httpx response body behind the part of urllib3's HTTPResponse that requests and the writer use
+
+    def __init__(self, response, on_close):
+        self.response = response
+        self.chunks = response.iter_bytes()
+        self.buffer = bytearray()
+        self.on_close = on_close
+        self.finished = False
+        self.closed = False
+        # for requests to take the cookies of the response
+        self._original_response = type('Original', (), {'msg': http.client.HTTPMessage()})()
+        for name, value in response.headers.multi_items():
+            self._original_response.msg[name] = value
+
+    def read(self, amt: int = None, decode_content: bool = True):
+        # httpx has already undone any Content-Encoding
+        try:
+            while amt is None or len(self.buffer) < amt:
+                chunk = next(self.chunks, None)
+                if chunk is None:
+                    self.finished = True
+                    break
+                self.buffer += chunk
+        except httpx.HTTPError as e:
+            self.close()
+            raise get_request_error(e) from e
+        amt = len(self.buffer) if amt is None else amt
+        data = bytes(self.buffer[:amt])
+        del self.buffer[:amt]
+        if not data:
+            self.release_conn()
+        return data
+
+    def stream(self, amt: int = 65536, decode_content: bool = True):
+        while data := self.read(amt):
+            yield data
+
+    def release_conn(self):
+        self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            if not self.finished and self.response.http_version == 'HTTP/2':
+                reset_stream(self.response)
+            self.response.close()
+            self.on_close()
+
+
+class HTTP2Adapter(HTTPAdapter):
+    # with --http2, https requests are multiplexed as streams over one httpx connection per host;
+    # hosts that only answer in HTTP/1.1 go back to urllib3 for the rest of the run; subclasses set self.args before __init__
+
+    def __init__(self, **kwargs):
+        self.http2_clients = {}
+        self.http1_hosts = set()
+        self.streams = {}
+        self.http2_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def get_trace(self):
+        return None
+
+    def get_http2_client(self, verify, cert):
+        with self.http2_lock:
+            key = verify, cert
+            if key not in self.http2_clients:
+                self.http2_clients[key] = httpx.Client(http2=True, verify=verify, cert=cert, follow_redirects=False,
+                                                       limits=httpx.Limits(max_connections=None, max_keepalive_connections=self.args.pool_connections))
+            return self.http2_clients[key]
+
+    def get_streams(self, host: str):
+        with self.http2_lock:
+            if host not in self.streams:
+                self.streams[host] = threading.BoundedSemaphore(self.args.max_streams)
+            return self.streams[host]
+
+    def use_http2(self, url: str):
+        parts = urlsplit(url)
+        return self.args.http2 and httpx is not None and parts.scheme == 'https' and parts.netloc not in self.http1_hosts
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if not self.use_http2(request.url):
+            return super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+        host = urlsplit(request.url).netloc
+        trace = self.get_trace()
+        streams = self.get_streams(host)
+        started = time.perf_counter()
+        streams.acquire()
+        if trace is not None and time.perf_counter() - started >= 0.001:
+            trace.add('queue', started, time.perf_counter())
+
+        phase_started = {}
+
+        def on_trace_event(name: str, info: dict):
+            step, _, state = name.rpartition('.')
+            if state == 'started':
+                phase_started[step] = time.perf_counter()
+            elif state == 'complete' and step in PHASES and trace is not None:
+                trace.add(PHASES[step], phase_started[step], time.perf_counter())
+                if step == 'connection.connect_tcp':
+                    trace.connected = time.perf_counter()
+
+        client = self.get_http2_client(verify, cert)
+        try:
+            http2_request = client.build_request(request.method, request.url, headers=dict(request.headers), content=request.body,
+                                                 timeout=get_timeout(timeout), extensions={'trace': on_trace_event})
+            http2_response = client.send(http2_request, stream=True)
+        except httpx.HTTPError as e:
+            streams.release()
+            raise get_request_error(e) from e
+        except BaseException:
+            streams.release()
+            raise
+
+        if http2_response.http_version != 'HTTP/2':
+            with self.http2_lock:
+                if host not in self.http1_hosts:
+                    self.http1_hosts.add(host)
+                    print('⚠️', f'{host} does not speak HTTP/2, falling back to HTTP/1.1')
+
+        response = requests.Response()
+        response.status_code = http2_response.status_code
+        response.headers = CaseInsensitiveDict(http2_response.headers.items())
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = HTTP2Body(http2_response, streams.release)
+        response.reason = http2_response.reason_phrase
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        extract_cookies_to_jar(response.cookies, request, response.raw)
+        return response
+
+    def close(self):
+        super().close()
+        with self.http2_lock:
+            for client in self.http2_clients.values():
+                client.close()
+            self.http2_clients.clear()
@@ -0,0 +1,225 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from ctf_collect.jobs import print
+from ctf_collect.manifest import MANIFEST_FILE_NAME
+from ctf_collect.progress import format_size
+
+# the files the downloaders write challenge text to
+DESCRIPTION_FILE_NAMES = ('description.txt', 'README.md')
+
+# unicode61 would take a whole run of Chinese as one token, so every CJK character is made a token of its own
+# and a word of several characters is searched as a phrase
+CJK = r'[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS challs (
+    id INTEGER PRIMARY KEY,
+    platform TEXT,
+    game TEXT NOT NULL,
+    category TEXT NOT NULL,
+    chall TEXT NOT NULL,
+    directory TEXT,
+    description TEXT,
+    updated REAL,
+    UNIQUE (platform, game, category, chall)
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    chall_id INTEGER NOT NULL REFERENCES challs (id) ON DELETE CASCADE,
+    name TEXT,
+    size INTEGER,
+    sha256 TEXT,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS files_chall_id ON files (chall_id);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+CREATE VIRTUAL TABLE IF NOT EXISTS challs_fts USING fts5 (game, category, chall, description, files, tokenize = 'unicode61 remove_diacritics 2');
+'''
+
+# bm25 weights of the columns of challs_fts, a hit in the challenge name counts most
+RANK = 'bm25(challs_fts, 1.0, 2.0, 10.0, 1.0, 3.0)'
+
+
+def segment(text: str):
+    return re.sub(f'({CJK})', r' \1 ', text or '')
+
+
+def unsegment(text: str):
+    # join the characters again, also where snippet() marked them as hits one by one
+    text = re.sub(f'(?<={CJK})(\\]?) +(\\[?)(?={CJK})', r'\1\2', text)
+    return re.sub(f'(?<={CJK})\\]\\[(?={CJK})', '', text)
+
+
+def get_match_query(query: str):
+    # every word must appear, a word ending in * is a prefix; FTS5 syntax characters in the words are taken literally
+    phrases = []
+    for word in query.split():
+        prefix = word.endswith('*') and len(word) > 1
+        word = word.rstrip('*') if prefix else word
+        phrase = '"' + ' '.join(segment(word).split()).replace('"', '""') + '"'
+        phrases.append(phrase + ('*' if prefix else ''))
+    return ' '.join(phrases)
+
+
+class Index:
+
+    def __init__(self, path: str, platform: str = ''):
+        self.path = path
+        self.platform = platform
+        self.game = None
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # downloads run in several threads, every statement holds the lock
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.execute('PRAGMA synchronous = NORMAL')
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.executescript(SCHEMA)
+
+    def get_chall_id(self, category: str, chall: str, directory: str):
+        row = self.db.execute('SELECT id FROM challs WHERE platform = ? AND game = ? AND category = ? AND chall = ?', (self.platform, self.game, category, chall)).fetchone()
+        if row is not None:
+            return row[0]
+        return self.db.execute('INSERT INTO challs (platform, game, category, chall, directory, updated) VALUES (?, ?, ?, ?, ?, ?)',
+                               (self.platform, self.game, category, chall, directory, time.time())).lastrowid
+
+    def update_fts(self, chall_id: int):
+        game, category, chall, description = self.db.execute('SELECT game, category, chall, description FROM challs WHERE id = ?', (chall_id,)).fetchone()
+        files = ' '.join(name for name, in self.db.execute('SELECT name FROM files WHERE chall_id = ? ORDER BY name', (chall_id,)))
+        self.db.execute('DELETE FROM challs_fts WHERE rowid = ?', (chall_id,))
+        self.db.execute('INSERT INTO challs_fts (rowid, game, category, chall, description, files) VALUES (?, ?, ?, ?, ?, ?)',
+                        (chall_id, segment(game), segment(category), segment(chall), segment(description), segment(files)))
+
+    def add_description(self, category: str, chall: str, path: str, content: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        with self.lock, self.db:
+            chall_id = self.get_chall_id(category, chall, directory)
+            self.db.execute('UPDATE challs SET directory = ?, description = ?, updated = ? WHERE id = ?', (directory, content, time.time(), chall_id))
+            self.update_fts(chall_id)
+
+    def add_file(self, category: str, chall: str, path: str, size: int, sha256: str, url: str):
+        path = os.path.abspath(path)
+        with self.lock, self.db:
+            chall_id = self.get_chall_id(category, chall, os.path.dirname(path))
+            self.db.execute('INSERT OR REPLACE INTO files (path, chall_id, name, size, sha256, url) VALUES (?, ?, ?, ?, ?, ?)',
+                            (path, chall_id, os.path.basename(path), size, sha256, url.split('?')[0]))
+            self.db.execute('UPDATE challs SET updated = ? WHERE id = ?', (time.time(), chall_id))
+            self.update_fts(chall_id)
+
+    def search(self, query: str, limit: int = 20, game: str = None, category: str = None):
+        sql = f'''SELECT challs.id, challs.game, challs.category, challs.chall, challs.directory, challs.platform,
+                         snippet(challs_fts, 3, '[', ']', '...', 24), {RANK}
+                  FROM challs_fts JOIN challs ON challs.id = challs_fts.rowid
+                  WHERE challs_fts MATCH ?'''
+        params = [get_match_query(query)]
+        if game is not None:
+            sql += ' AND challs.game LIKE ?'
+            params.append(f'%{game}%')
+        if category is not None:
+            sql += ' AND challs.category = ? COLLATE NOCASE'
+            params.append(category)
+        sql += f' ORDER BY {RANK} LIMIT ?'
+        params.append(limit)
+        with self.lock:
+            hits = []
+            for chall_id, *hit, snippet, rank in self.db.execute(sql, params).fetchall():
+                files = self.db.execute('SELECT name, size, sha256, path FROM files WHERE chall_id = ? ORDER BY name', (chall_id,)).fetchall()
+                hits.append(dict(zip(('game', 'category', 'chall', 'directory', 'platform'), hit), snippet=unsegment(snippet), rank=rank, files=files))
+            return hits
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def start_index(args, game_title: str):
+    if args.search_index is not None:
+        args.search_index.game = game_title
+
+
+def index_description(args, local_path: str, content: str, title: str):
+    # title is "category/name" as printed
+    if args.search_index is not None and args.search_index.game is not None and os.path.basename(local_path) in DESCRIPTION_FILE_NAMES:
+        category, chall_name = title.split('/', 1)
+        args.search_index.add_description(category, chall_name, local_path, content)
+
+
+def index_file(args, local_path: str, size: int, sha256: str, url: str, title: str):
+    if args.search_index is not None and args.search_index.game is not None:
+        category, chall_name = title.split('/', 1)
+        args.search_index.add_file(category, chall_name, local_path, size, sha256, url)
+
+
+def create_index(args):
+    if args.no_index:
+        return None
+    return Index(args.index, args.platform)
+
+
+def add_game_directory(index: Index, root_directory: str, platform: str = '', game_title: str = None):
+    # index a game downloaded before the index existed: descriptions by their {category}/{chall} directory,
+    # attachments from the manifest
+    root_directory = os.path.abspath(root_directory)
+    index.platform = platform
+    index.game = game_title or os.path.basename(root_directory)
+    challs = {}
+    for dir_path, _, file_names in os.walk(root_directory):
+        for file_name in file_names:
+            if file_name not in DESCRIPTION_FILE_NAMES:
+                continue
+            parts = os.path.relpath(dir_path, root_directory).split(os.sep)
+            category, chall = (parts[0], parts[-1]) if len(parts) > 1 else ('', parts[0])
+            challs[dir_path] = category, chall
+            with open(os.path.join(dir_path, file_name), 'r', encoding='utf-8', errors='replace') as f:
+                index.add_description(category, chall, os.path.join(dir_path, file_name), f.read())
+
+    try:
+        with open(os.path.join(root_directory, MANIFEST_FILE_NAME), 'r', encoding='utf-8') as f:
+            attachments = json.load(f)['attachments']
+    except (OSError, ValueError, KeyError):
+        attachments = {}
+    for key, entry in attachments.items():
+        path = os.path.join(root_directory, entry['path'])
+        dir_path = os.path.dirname(path)
+        while dir_path not in challs and dir_path.startswith(root_directory + os.sep):
+            dir_path = os.path.dirname(dir_path)
+        category, chall = challs.get(dir_path, ('', os.path.basename(os.path.dirname(path))))
+        index.add_file(category, chall, path, entry.get('size'), entry.get('sha256'), entry.get('url') or key)
+    return len(challs), len(attachments)
+
+
+def search(args):
+    if not os.path.exists(args.index):
+        print('❌', f'No index at {args.index} yet, it is written by every download run')
+        sys.exit(1)
+    index = Index(args.index)
+    started = time.perf_counter()
+    hits = index.search(' '.join(args.query), args.limit, args.game, args.category)
+    elapsed = time.perf_counter() - started
+    index.close()
+    if args.json:
+        for hit in hits:
+            hit['files'] = [dict(zip(('name', 'size', 'sha256', 'path'), file)) for file in hit['files']]
+            print(json.dumps(hit, ensure_ascii=False))
+        return
+    for hit in hits:
+        print('🔎', f'{hit["game"]} / {hit["category"]} / {hit["chall"]}', f'[{hit["platform"]}]' if hit['platform'] else '')
+        print('  ', hit['directory'])
+        if hit['snippet']:
+            print('  ', ' '.join(hit['snippet'].split()))
+        for name, size, sha256, _ in hit['files']:
+            print('  ', f'📎 {name}', f'({format_size(size)})' if size is not None else '', sha256[:12] if sha256 else '')
+    print('📇', f'{len(hits)} hits in {elapsed * 1000:.1f} ms')
+
+
+def add(args):
+    index = Index(args.index)
+    for root_directory in args.root_directory:
+        challs, files = add_game_directory(index, root_directory, args.platform)
+        print('🗂', f'{index.game}: indexed {challs} challenges and {files} attachments')
+    index.close()
@@ -0,0 +1,22 @@
+import builtins
+from concurrent.futures import ThreadPoolExecutor
+from ctf_collect.progress import erase_progress, output_lock
+
+
+def print(*args, **kwargs):
+    # keep lines of concurrent workers from interleaving, and print them above the progress bars
+    with output_lock:
+        erase_progress()
+        builtins.print(*args, **kwargs, flush=True)
+
+
+def run_jobs(args, func, items):
+    if args.jobs <= 1:
+        for item in items:
+            func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        # consume results so worker exceptions are not silently dropped
+        for _ in executor.map(func, items):
+            pass
@@ -0,0 +1,37 @@
+import threading
+import time
+
+
+class TokenBucket:
+    # refills at rate tokens per second up to capacity; a take beyond what is there waits for the refill,
+    # and takers are served in the order they came, since a take reserves its tokens before sleeping
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, amount: float = 1):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        if delay > 0:
+            time.sleep(delay)
+
+
+def create_bandwidth_limiter(args):
+    if args.bandwidth <= 0:
+        return None
+    # a quarter of a second worth of bytes may pass at once, so the speed stays even
+    return TokenBucket(args.bandwidth, args.bandwidth / 4)
+
+
+def create_rate_limiter(args):
+    if args.rate <= 0:
+        return None
+    return TokenBucket(args.rate, max(args.burst, 1))
@@ -0,0 +1,99 @@
+import atexit
+import json
+import os
+import re
+import threading
+import time
+
+MANIFEST_FILE_NAME = '.manifest.json'
+
+# records are written out at most this often, and at exit
+SAVE_INTERVAL = 2
+
+
+def get_root_directory(args, game_title: str):
+    # the game level part of --root-directory, where per-game state is kept
+    root_directory = args.root_directory \
+                         .strip() \
+                         .rstrip('/\\') \
+                         .format(game=game_title, tag='', category='', chall='', origin='')
+    root_directory = re.sub(r'[*?"<>|]', '_', root_directory)
+    return os.path.normpath(root_directory)
+
+
+class Manifest:
+    # what was downloaded in earlier runs of a game, keyed by attachment URL
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.dirty = False
+        self.saved = time.monotonic()
+        self.flushed_at_exit = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.attachments = json.load(f)['attachments']
+        except (OSError, ValueError, KeyError):
+            self.attachments = {}
+
+    def get(self, key: str):
+        return self.attachments.get(key)
+
+    def get_local_path(self, entry: dict):
+        # paths are kept relative to the manifest, so the game directory can be moved or read from elsewhere
+        return os.path.join(os.path.dirname(self.path), entry['path'])
+
+    def is_tracked(self, key: str):
+        # a file still on disk that the platform can be asked about; without an ETag or Last-Modified the request
+        # would be unconditional and overwrite it, so such files get the "already exists" skip like untracked ones
+        entry = self.get(key)
+        return entry is not None and bool(entry.get('etag') or entry.get('last_modified')) \
+            and os.path.exists(self.get_local_path(entry))
+
+    def get_conditional_headers(self, key: str):
+        # only ask "changed since?" for files that are still on disk
+        if not self.is_tracked(key):
+            return {}
+        entry = self.get(key)
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def record(self, key: str, **entry):
+        entry['path'] = os.path.relpath(entry['path'], os.path.dirname(self.path) or '.')
+        with self.lock:
+            self.attachments[key] = entry
+            if not self.flushed_at_exit:
+                # only manifests that are written to, the mirror and verify read many
+                self.flushed_at_exit = True
+                atexit.register(self.flush)
+            self.dirty = True
+            due = time.monotonic() - self.saved >= SAVE_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        if self.dirty:
+            self.save()
+
+    def save(self):
+        # rewriting the whole file for every attachment would make a game quadratic, so records are batched;
+        # the file is written outside the lock the downloads record under
+        with self.save_lock:
+            with self.lock:
+                data = json.dumps({'attachments': self.attachments}, ensure_ascii=False, indent=1)
+                self.dirty = False
+                self.saved = time.monotonic()
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+
+
+def load_manifest(args, game_title: str):
+    return Manifest(os.path.join(get_root_directory(args, game_title), MANIFEST_FILE_NAME))
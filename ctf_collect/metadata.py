@@ -0,0 +1,48 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_DONE = object()
+
+
+async def _fetch_all(items, fetch, concurrency: int, results: queue.Queue):
+    # requests is blocking, so each fetch runs on the loop's executor while the loop bounds and collects them
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(item):
+        async with semaphore:
+            try:
+                info = await asyncio.to_thread(fetch, item)
+            except Exception as e:
+                results.put((item, None, e))
+            else:
+                results.put((item, info, None))
+
+    await asyncio.gather(*(fetch_one(item) for item in items))
+
+
+def iter_metadata(items, fetch, concurrency: int):
+    # call fetch(item) for every item concurrently and yield (item, info, error) in completion order,
+    # so the download stage can start on the first record while the rest are still in flight
+    items = list(items)
+    if concurrency <= 1:
+        for item in items:
+            try:
+                yield item, fetch(item), None
+            except Exception as e:
+                yield item, None, e
+        return
+
+    results = queue.Queue()
+
+    def run():
+        try:
+            asyncio.run(_fetch_all(items, fetch, concurrency, results))
+        finally:
+            results.put(_DONE)
+
+    threading.Thread(target=run, daemon=True).start()
+    while (entry := results.get()) is not _DONE:
+        yield entry
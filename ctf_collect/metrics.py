@@ -0,0 +1,244 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from ctf_collect.jobs import print
+from ctf_collect.progress import format_duration, format_size
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 6, 8)
+PHASES = ('queue', 'dns', 'connect', 'tls', 'ttfb', 'transfer')
+
+# outcomes of an attachment that was neither downloaded nor failed
+SKIPPED = {'exists', 'not_modified', 'too_large', 'no_attachment'}
+
+HELP = {
+    'challenges_total': 'Challenges processed, by category.',
+    'files_total': 'Attachments by category and outcome (downloaded, mirrored, linked, exists, not_modified, too_large, no_attachment, failed).',
+    'downloaded_bytes_total': 'Attachment bytes received, by category.',
+    'requests_total': 'HTTP requests sent, by kind and status.',
+    'request_duration_seconds': 'Time from sending a request until its response headers arrived.',
+    'request_attempts': 'Attempts needed per request, including retries.',
+    'cache_requests_total': 'Challenge info requests by cache result (hit, revalidated, miss).',
+    'archives_total': 'Downloaded archives by unpack result (extracted, unchanged, limited, failed).',
+    'request_phase_seconds_total': 'Time spent in each phase of all requests.',
+    'run_duration_seconds': 'Wall time of the run so far.',
+    'last_update_timestamp_seconds': 'When this file was written.',
+}
+
+
+# the challenge each worker thread is on, so that a failed file is charged to it
+_current = threading.local()
+
+
+class Histogram:
+    # cumulative bucket counts, sum and count as Prometheus keeps them, so a long watch takes no more memory
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.sum += other.sum
+
+    def get_quantile(self, quantile: float):
+        # interpolated within the bucket the rank falls into, as histogram_quantile() does;
+        # ranks beyond the last bucket get its bound
+        rank = quantile * self.count
+        lower, below = 0.0, 0
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= rank:
+                return lower + (bound - lower) * (rank - below) / (count - below) if count > below else bound
+            lower, below = bound, count
+        return self.buckets[-1]
+
+
+class Metrics:
+
+    def __init__(self, platform: str):
+        self.platform = platform
+        self.game = None
+        self.started = time.monotonic()
+        self.counters = defaultdict(float)    # (name, labels) -> value
+        self.histograms = {}                  # (name, labels) -> Histogram
+        self.failed_challs = set()            # ids of challenges with a failed file since the last pop_failed_challs()
+        self.lock = threading.Lock()
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        with self.lock:
+            self.counters[name, tuple(sorted(labels.items()))] += amount
+
+    def observe(self, name: str, value: float, buckets: tuple, **labels):
+        key = name, tuple(sorted(labels.items()))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def fail_chall(self, id):
+        with self.lock:
+            self.failed_challs.add(id)
+
+    def pop_failed_challs(self):
+        with self.lock:
+            failed, self.failed_challs = self.failed_challs, set()
+        return failed
+
+    def get(self, name: str, **labels):
+        # the sum over every series of name that has these labels
+        with self.lock:
+            return sum(value for (series, series_labels), value in self.counters.items()
+                       if series == name and all(dict(series_labels).get(k) == v for k, v in labels.items()))
+
+    def get_histogram(self, name: str):
+        # every series of name added up, None if nothing was observed
+        with self.lock:
+            histograms = [histogram for (series, _), histogram in self.histograms.items() if series == name]
+            if not histograms:
+                return None
+            merged = Histogram(histograms[0].buckets)
+            for histogram in histograms:
+                merged.merge(histogram)
+        return merged
+
+    def observe_request(self, trace):
+        status = str(trace.status) if trace.status is not None else 'error'
+        self.inc('requests_total', kind=trace.kind, status=status)
+        for phase, started, ended in trace.phases:
+            self.inc('request_phase_seconds_total', ended - started, phase=phase)
+            if phase == 'ttfb':
+                self.observe('request_duration_seconds', ended - trace.started, LATENCY_BUCKETS, kind=trace.kind)
+
+    def format(self):
+        # the Prometheus text exposition format, every series labelled with the platform and the game
+        common = {'platform': self.platform, 'game': self.game or ''}
+
+        def format_labels(labels):
+            labels = dict(common, **dict(labels))
+            escaped = (str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for value in labels.values())
+            return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+        counters.append((('run_duration_seconds', ()), time.monotonic() - self.started))
+        counters.append((('last_update_timestamp_seconds', ()), time.time()))
+        described = set()
+        for (name, labels), value in counters:
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP ctf_collect_{name} {HELP[name]}')
+                lines.append(f'# TYPE ctf_collect_{name} {"counter" if name.endswith("_total") else "gauge"}')
+            lines.append(f'ctf_collect_{name}{format_labels(labels)} {value:g}')
+        for (name, labels), histogram in histograms:
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP ctf_collect_{name} {HELP[name]}')
+                lines.append(f'# TYPE ctf_collect_{name} histogram')
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f'ctf_collect_{name}_bucket{format_labels(labels + (("le", f"{bound:g}"),))} {count}')
+            lines.append(f'ctf_collect_{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+            lines.append(f'ctf_collect_{name}_sum{format_labels(labels)} {histogram.sum:g}')
+            lines.append(f'ctf_collect_{name}_count{format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        # the textfile collector may read at any moment, so the file is replaced in one step
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+            f.write(self.format())
+        os.replace(f'{path}.tmp', path)
+
+    def print_summary(self):
+        with self.lock:
+            categories = sorted({dict(labels)['category'] for (name, labels) in self.counters if name in ('challenges_total', 'files_total')})
+        for category in categories + ['total']:
+            labels = {} if category == 'total' else {'category': category}
+            skipped = sum(self.get('files_total', outcome=outcome, **labels) for outcome in SKIPPED)
+            print('📊' if category == 'total' else '  ',
+                  category.ljust(12),
+                  f'{self.get("challenges_total", **labels):.0f} challs'.ljust(12),
+                  f'{sum(self.get("files_total", outcome=outcome, **labels) for outcome in ("downloaded", "mirrored", "linked")):.0f} saved'.ljust(10),
+                  f'{skipped:.0f} skipped'.ljust(12),
+                  f'{self.get("files_total", outcome="failed", **labels):.0f} failed'.ljust(10),
+                  format_size(self.get('downloaded_bytes_total', **labels)))
+
+        durations = self.get_histogram('request_duration_seconds')
+        attempts = self.get_histogram('request_attempts')
+        requests = f'{self.get("requests_total"):.0f} requests'
+        if durations is not None:
+            requests += f', {durations.get_quantile(0.5):.3f} s median and {durations.get_quantile(0.95):.3f} s p95 to response headers'
+        if attempts is not None:
+            # the first bucket is a single attempt
+            requests += f', {attempts.count - attempts.counts[0]} retried'
+        print('  ', requests)
+        if self.get('cache_requests_total'):
+            print('  ', f'cache: {self.get("cache_requests_total", result="hit"):.0f} hits, '
+                        f'{self.get("cache_requests_total", result="revalidated"):.0f} revalidated, '
+                        f'{self.get("cache_requests_total", result="miss"):.0f} misses')
+        if self.get('files_total', outcome='mirrored'):
+            print('  ', f'mirror: {self.get("files_total", outcome="mirrored"):.0f} attachments from the team mirror')
+        if self.get('archives_total'):
+            print('  ', f'archives: {self.get("archives_total", result="extracted"):.0f} unpacked, '
+                        f'{self.get("archives_total", result="unchanged"):.0f} unchanged, '
+                        f'{self.get("archives_total", result="limited"):.0f} stopped at a limit, '
+                        f'{self.get("archives_total", result="failed"):.0f} failed')
+        phases = ', '.join(f'{phase} {self.get("request_phase_seconds_total", phase=phase):.2f} s' for phase in PHASES
+                           if self.get('request_phase_seconds_total', phase=phase))
+        print('  ', f'time in requests: {phases or "none"}; run took {format_duration(time.monotonic() - self.started)}')
+
+
+def count_chall(args, category: str):
+    args.metrics.inc('challenges_total', category=category.lower())
+
+
+@contextmanager
+def track_chall(id):
+    # failed files counted inside are charged to the challenge id
+    _current.chall = id
+    try:
+        yield
+    finally:
+        _current.chall = None
+
+
+def count_file(args, title: str, outcome: str):
+    # title is "category/name" as printed, or just the category
+    args.metrics.inc('files_total', category=title.split('/')[0].lower(), outcome=outcome)
+    if outcome == 'failed' and getattr(_current, 'chall', None) is not None:
+        args.metrics.fail_chall(_current.chall)
+
+
+def count_bytes(args, title: str, amount: int):
+    args.metrics.inc('downloaded_bytes_total', amount, category=title.split('/')[0].lower())
+
+
+def write_metrics(args, game_title: str):
+    args.metrics.game = game_title
+    if args.metrics_file is not None:
+        args.metrics.write(args.metrics_file)
+
+
+def finish_metrics(args, game_title: str):
+    write_metrics(args, game_title)
+    if not args.no_summary:
+        args.metrics.print_summary()
+    if args.metrics_file is not None:
+        print('📈', f'Metrics written to {args.metrics_file}')
+
+
+def create_metrics(args):
+    return Metrics(args.platform)
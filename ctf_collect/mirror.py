@@ -0,0 +1,282 @@
+import json
+import os
+import re
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from ctf_collect.index import DESCRIPTION_FILE_NAMES
+from ctf_collect.jobs import print
+from ctf_collect.manifest import MANIFEST_FILE_NAME, Manifest, get_root_directory
+from ctf_collect.progress import format_size
+
+# files of downloads and unpacking still in progress, never served
+UNFINISHED_SUFFIXES = ('.part', '.part.json', '.link', '.tmp', '.unpacking')
+
+
+def get_validator_headers(entry: dict):
+    # the validators the platform sent for the version in a manifest entry
+    headers = {}
+    if entry.get('etag'):
+        headers['ETag'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['Last-Modified'] = entry['last_modified']
+    return headers
+
+
+class MirrorServer(ThreadingHTTPServer):
+    # the game directories under root that have a manifest, read-only and nothing else in root; only the manifest,
+    # the attachments it tracks and the descriptions are served, attachments with the validators of the platform
+    # from the manifest, so a teammate asks the platform about them and resumes from the mirror alike
+    daemon_threads = True
+
+    def __init__(self, address, root: str):
+        self.root = os.path.realpath(root)
+        self.manifests = {}     # game directory -> (mtime, {path relative to the game: manifest entry})
+        self.lock = threading.Lock()
+        super().__init__(address, MirrorHandler)
+
+    def is_game(self, name: str):
+        return not name.startswith('.') and os.path.isfile(os.path.join(self.root, name, MANIFEST_FILE_NAME))
+
+    def get_games(self):
+        games = []
+        for name in sorted(os.listdir(self.root)):
+            manifest_path = os.path.join(self.root, name, MANIFEST_FILE_NAME)
+            if self.is_game(name):
+                attachments = Manifest(manifest_path).attachments.values()
+                games.append({'game': name, 'attachments': len(attachments), 'size': sum(entry.get('size') or 0 for entry in attachments)})
+        return games
+
+    def get_entry(self, game: str, path: str):
+        manifest_path = os.path.join(self.root, game, MANIFEST_FILE_NAME)
+        try:
+            mtime = os.stat(manifest_path).st_mtime_ns
+        except OSError:
+            return None
+        with self.lock:
+            # the manifest is rewritten while the game is still being downloaded here
+            if game not in self.manifests or self.manifests[game][0] != mtime:
+                entries = {os.path.normpath(entry['path']): entry for entry in Manifest(manifest_path).attachments.values()}
+                self.manifests[game] = mtime, entries
+            return self.manifests[game][1].get(os.path.normpath(path))
+
+    def handle_error(self, request, client_address):
+        # downloaders close connections in the middle of bodies they do not want, and at exit
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MirrorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, Nagle would hold the body back for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def send_empty(self, status: int, **headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def get_parts(self):
+        # the request path as names under root, None for anything but a game's manifest, an attachment it tracks
+        # or a description; the rest of root may hold anything, so nothing is served just for being there
+        parts = [unquote(part) for part in urlsplit(self.path).path.split('/') if part]
+        for part in parts:
+            # an encoded slash would make one part climb out of the game directory
+            if part in ('.', '..') or '/' in part or '\\' in part or part.endswith(UNFINISHED_SUFFIXES):
+                return None
+        if len(parts) < 2 or not self.server.is_game(parts[0]):
+            return None
+        if parts[1:] != [MANIFEST_FILE_NAME] and parts[-1] not in DESCRIPTION_FILE_NAMES \
+                and self.server.get_entry(parts[0], os.path.join(*parts[1:])) is None:
+            return None
+        path = os.path.join(self.server.root, *parts)
+        game_directory = os.path.realpath(os.path.join(self.server.root, parts[0]))
+        if not os.path.realpath(path).startswith(game_directory + os.sep) or not os.path.isfile(path):
+            return None
+        return parts
+
+    def do_GET(self):
+        if urlsplit(self.path).path == '/':
+            body = json.dumps({'games': self.server.get_games()}, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if self.command == 'GET':
+                self.wfile.write(body)
+            return
+
+        parts = self.get_parts()
+        if parts is None:
+            self.send_empty(404)
+            return
+        path = os.path.join(self.server.root, *parts)
+        entry = self.server.get_entry(parts[0], os.path.join(*parts[1:]))
+        validators = get_validator_headers(entry) if entry is not None else {}
+        size = os.path.getsize(path)
+
+        start, end, status = 0, size - 1, 200
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match and self.headers.get('If-Range') in (None, *validators.values()):
+            start, status = int(match[1]), 206
+            end = min(int(match[2]) if match[2] else end, end)
+            if start > end:
+                self.send_empty(416, **{'Content-Range': f'bytes */{size}'})
+                return
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json' if parts[-1] == MANIFEST_FILE_NAME else 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        for name, value in validators.items():
+            self.send_header(name, value)
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if self.command == 'HEAD' or end < start:
+            return
+        with open(path, 'rb') as f:
+            # straight from the page cache to the socket where the system has sendfile()
+            self.connection.sendfile(f, start, end - start + 1)
+        if entry is not None:
+            print('📤', '/'.join(parts[1:]).ljust(24), f'to {self.client_address[0]} ({format_size(end - start + 1)})')
+
+    do_HEAD = do_GET
+
+
+class MirrorAdapter(HTTPAdapter):
+    # download.py resumes and fetches segments through the session of the response, without a timeout of its own
+
+    def __init__(self, timeout: float, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def get_lan_address(host: str):
+    if host not in ('', '0.0.0.0', '::'):
+        return host
+    # the address of the interface that routes outside, connecting a UDP socket sends nothing
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(('192.0.2.1', 9))
+            return s.getsockname()[0]
+    except OSError:
+        return socket.gethostname()
+
+
+def serve(args):
+    server = MirrorServer((args.host, args.port), args.directory)
+    url = f'http://{get_lan_address(args.host)}:{server.server_address[1]}'
+    if args.host in ('localhost', '127.0.0.1', '::1'):
+        print('🪞', f'Serving {server.root} on {url}, only to this machine; add "--host 0.0.0.0" to share it on the LAN')
+    else:
+        print('🪞', f'Serving {server.root} on {url}, teammates add "--mirror {url}" to download from here')
+    for game in server.get_games():
+        print('  ', game['game'].ljust(24), f'{game["attachments"]} attachments, {format_size(game["size"])}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('\n👋', 'Stopped serving.')
+    finally:
+        server.server_close()
+
+
+class Mirror:
+    # a teammate's "ctf-collect serve", which attachments are taken from while the platform still has the same version
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        # a session of its own, the one for the platform carries the token in its headers
+        self.session = requests.Session()
+        self.session.mount('http://', MirrorAdapter(timeout))
+        self.session.mount('https://', MirrorAdapter(timeout))
+        self.game_directory = None
+        self.game_url = None
+        self.attachments = {}
+        self.lock = threading.Lock()
+
+    def load(self, game_directory: str):
+        # the manifest of the game on the mirror, None if the mirror cannot be reached
+        self.game_directory = game_directory
+        self.game_url = f'{self.url}/{quote(game_directory)}'
+        try:
+            response = self.session.get(f'{self.game_url}/{MANIFEST_FILE_NAME}', timeout=self.timeout)
+            attachments = response.json()['attachments'] if response.status_code == 200 else {}
+        except (requests.RequestException, ValueError, KeyError) as e:
+            print('⚠️', f'Mirror {self.url} is not reachable ({type(e).__name__}), downloading from the platform')
+            attachments = None
+        with self.lock:
+            self.attachments = attachments or {}
+        return attachments
+
+    def start_round(self):
+        # while watching, the mirror gets the challenges released in the meantime too
+        if self.game_directory is not None:
+            self.load(self.game_directory)
+
+    def get_entry(self, key: str):
+        with self.lock:
+            return self.attachments.get(key)
+
+    def open(self, entry: dict, url: str):
+        # the copy on the mirror as a streaming response, None if the mirror cannot serve it
+        parts = re.split(r'[\\/]', entry['path'])
+        try:
+            response = self.session.get(f'{self.game_url}/{"/".join(quote(part) for part in parts)}', stream=True, timeout=self.timeout)
+        except requests.RequestException:
+            return None
+        if response.status_code != 200:
+            response.close()
+            return None
+        # platforms name the file in Content-Disposition, the mirror has it under the name it was saved with
+        response.headers['Content-Disposition'] = f'attachment; filename="{parts[-1]}"'
+        response.platform_url = url
+        return response
+
+
+def start_mirror(args, game_title: str):
+    if args.team_mirror is not None:
+        attachments = args.team_mirror.load(os.path.basename(get_root_directory(args, game_title)))
+        if attachments is not None:
+            print('🪞', f'Mirror {args.team_mirror.url} has {len(attachments)} attachments of {game_title}')
+
+
+def get_mirror_entry(args, key: str):
+    return args.team_mirror.get_entry(key) if args.team_mirror is not None else None
+
+
+def get_mirror_headers(entry: dict):
+    # asks the platform whether it still serves what the mirror got
+    if entry is None:
+        return {}
+    headers = get_validator_headers(entry)
+    return {'If-None-Match' if name == 'ETag' else 'If-Modified-Since': value for name, value in headers.items()}
+
+
+def open_mirror(args, url: str, entry: dict):
+    return args.team_mirror.open(entry, url)
+
+
+def is_mirrored(args, response):
+    return args.team_mirror is not None and getattr(response, 'platform_url', None) is not None
+
+
+def create_mirror(args):
+    if args.mirror is None:
+        return None
+    return Mirror(args.mirror, args.timeout)
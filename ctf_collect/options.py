@@ -0,0 +1,172 @@
+import os
+import re
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def get_default_cache_directory():
+    base = os.environ.get('XDG_CACHE_HOME') or os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ctf_collect')
+
+
+def get_default_index_path():
+    base = os.environ.get('XDG_DATA_HOME') or os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(base, 'ctf_collect', 'index.sqlite')
+
+
+def parse_speed(value: str):
+    # "500K", "2M", "1.5MB/s" or plain bytes
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMG]?)(?:I?B)?(?:/S)?\s*', value.upper())
+    if match is None:
+        raise ValueError(f'invalid speed: {value}')
+    return float(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+
+def parse_weights(value: str):
+    # "pwn=2,crypto=1,misc=-1"
+    weights = {}
+    for item in value.split(','):
+        if item.strip():
+            category, _, weight = item.partition('=')
+            weights[category.strip().lower()] = float(weight or 1)
+    return weights
+
+
+def add_cache_arguments(parser):
+    cache_group = parser.add_argument_group('cache options')
+    cache_group.add_argument('--cache-dir', type=str, default=get_default_cache_directory(), help='where challenge info responses are cached between runs, default is ~/.cache/ctf_collect')
+    cache_group.add_argument('--cache-ttl', type=float, default=0.0, help='seconds a cached response is used without asking the platform, default is 0 (always revalidate, which only saves the body)')
+    cache_group.add_argument('--no-cache', action='store_true', help='if specified, challenge info is neither read from nor written to the cache')
+
+
+def add_download_arguments(parser):
+    download_group = parser.add_argument_group('download options')
+    download_group.add_argument('--segments', type=int, default=1, help='split large attachments into this many byte ranges fetched on parallel connections, default is 1 (off)')
+    download_group.add_argument('--segment-threshold', type=float, default=32.0, help='min size in MB of an attachment to be split by "--segments", default is 32.0')
+    download_group.add_argument('--progress', choices=['auto', 'bars', 'lines', 'off'], default='auto', help='how to show download progress: bars redrawn in place, a summary line every 10 seconds, or nothing; default is auto (bars on a terminal, lines otherwise)')
+
+
+def add_extract_arguments(parser):
+    extract_group = parser.add_argument_group('extract options')
+    extract_group.add_argument('--extract', action='store_true', help='unpack every downloaded zip and tarball next to it in the background, e.g. attachment.zip into attachment/, with a listing and file type summary in attachment.contents.txt')
+    extract_group.add_argument('--extract-workers', type=int, default=os.cpu_count(), help='number of processes unpacking archives at the same time, default is the number of CPUs')
+    extract_group.add_argument('--extract-max-size', type=float, default=1024.0, help='max total size in MB unpacked from one archive including nested ones, the rest is left packed, default is 1024.0')
+    extract_group.add_argument('--extract-max-files', type=int, default=10000, help='max number of files unpacked from one archive including nested ones, default is 10000')
+    extract_group.add_argument('--extract-depth', type=int, default=2, help='how many levels of archives inside archives are unpacked too, deeper ones are only listed, default is 2')
+
+
+def add_index_arguments(parser):
+    index_group = parser.add_argument_group('index options')
+    index_group.add_argument('--index', type=str, default=get_default_index_path(), metavar='FILE', help='SQLite full-text index of every downloaded challenge of every game, searched with "ctf-collect search", default is ~/.local/share/ctf_collect/index.sqlite')
+    index_group.add_argument('--no-index', action='store_true', help='if specified, challenges of this run are not added to the index')
+
+
+def add_jobs_arguments(parser):
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of challenges to download at the same time, default is 1 (one by one)')
+
+
+def add_limit_arguments(parser):
+    limit_group = parser.add_argument_group('rate limit options')
+    limit_group.add_argument('--rate', type=float, default=0.0, help='max requests per second to each host, default is 0 (unlimited)')
+    limit_group.add_argument('--burst', type=int, default=1, help='requests that may be sent at once before "--rate" applies, default is 1')
+    limit_group.add_argument('--bandwidth', type=parse_speed, default=0.0, help='max download speed shared by all transfers, e.g. 500K or 2M (bytes per second), default is 0 (unlimited)')
+
+
+def add_metadata_arguments(parser):
+    parser.add_argument('--metadata-concurrency', type=int, default=1, help='number of challenge details fetched at the same time before downloading, default is 1 (one by one)')
+
+
+def add_metrics_arguments(parser):
+    metrics_group = parser.add_argument_group('metrics options')
+    metrics_group.add_argument('--metrics-file', type=str, default=None, metavar='FILE', help='write the counters and histograms of the run to FILE in the Prometheus text format, e.g. for the textfile collector of node_exporter; rewritten after every poll while watching')
+    metrics_group.add_argument('--no-summary', action='store_true', help='if specified, no summary table is printed when the run is done')
+
+
+def add_mirror_arguments(parser):
+    mirror_group = parser.add_argument_group('mirror options')
+    mirror_group.add_argument('--mirror', type=str, metavar='URL', help='a teammate\'s "ctf-collect serve", e.g. http://192.168.1.10:8080; attachments are taken from it when the platform still serves the same version, the rest come from the platform')
+
+
+def add_plan_arguments(parser):
+    plan_group = parser.add_argument_group('plan options')
+    plan_group.add_argument('--dry-run', type=str, nargs='?', const='plan.json', metavar='PLAN', help='resolve every challenge, attachment URL, size and local path without downloading, write them to PLAN (default is plan.json) and print totals by category')
+    plan_group.add_argument('--execute', type=str, metavar='PLAN', help='download everything in a PLAN written by "--dry-run", without fetching challenge info again')
+
+
+def add_retry_arguments(parser):
+    retry_group = parser.add_argument_group('retry options')
+    retry_group.add_argument('--retries', type=int, default=3, help='times to retry a request after a connection error, a timeout, 429 or 5xx, default is 3')
+    retry_group.add_argument('--retry-backoff', type=float, default=1.0, help='base delay in seconds before a retry, doubled (with jitter) for every further attempt, default is 1.0')
+    retry_group.add_argument('--timeout', type=float, default=30.0, help='seconds to wait for a connection or for the next bytes of a response, default is 30.0')
+    retry_group.add_argument('--breaker-threshold', type=int, default=5, help='consecutive failures after which requests to a host are paused, default is 5')
+    retry_group.add_argument('--breaker-cooldown', type=float, default=60.0, help='seconds to pause a failing host before trying it again, default is 60.0')
+
+
+def add_schedule_arguments(parser):
+    schedule_group = parser.add_argument_group('schedule options')
+    schedule_group.add_argument('--order', choices=['priority', 'list'], default='priority', help='priority writes descriptions and small attachments while challenge info comes in, and then downloads the rest smallest first; list keeps the order of the challenge list; default is priority')
+    schedule_group.add_argument('--small-size', type=float, default=1.0, help='attachments up to this size in MB are downloaded right away instead of waiting for their turn, default is 1.0')
+    schedule_group.add_argument('--category-weights', type=parse_weights, default={}, metavar='WEIGHTS', help='categories with a higher weight are downloaded first, e.g. pwn=2,crypto=1,misc=-1; the default weight is 0')
+
+
+def add_session_arguments(parser):
+    conn_group = parser.add_argument_group('connection options')
+    conn_group.add_argument('--pool-connections', type=int, default=4, help='number of hosts to keep a connection pool for, default is 4')
+    conn_group.add_argument('--max-per-host', type=int, default=4, help='max connections kept open to each host, concurrent requests beyond it wait for a free one, default is 4')
+    conn_group.add_argument('--http2', action='store_true', help='send the requests to https hosts that support HTTP/2 as streams over a single connection per host, hosts without it get HTTP/1.1; needs "pip install httpx[http2]"')
+    conn_group.add_argument('--max-streams', type=int, default=16, help='max requests in flight at once on the HTTP/2 connection to a host, default is 16')
+
+
+def add_store_arguments(parser):
+    store_group = parser.add_argument_group('store options')
+    store_group.add_argument('--store', type=str, metavar='DIRECTORY', help='content-addressed attachment store shared by all games, downloaded files are linked from it so identical attachments take disk space only once')
+    store_group.add_argument('--store-mode', type=str, choices=['hardlink', 'reflink'], default='hardlink', help='how files are linked from the store, "reflink" gives independent copy-on-write copies where the file system supports it, default is hardlink')
+
+
+def add_trace_arguments(parser):
+    trace_group = parser.add_argument_group('trace options')
+    trace_group.add_argument('--trace', type=str, default=None, metavar='FILE', help='record queue, DNS, connect, TLS, time to first byte and transfer of every request into FILE in Chrome trace_event format, for chrome://tracing or ui.perfetto.dev')
+    trace_group.add_argument('--event-log', type=str, default=None, metavar='FILE', help='write every finished request with its timings as one JSON line to FILE')
+
+
+def add_verify_arguments(parser):
+    verify_group = parser.add_argument_group('verify options')
+    verify_group.add_argument('--verify', action='store_true', help='do not download, rehash every file recorded in the manifest of the game, list the ones that need a re-fetch and exit with status 1 if there are any')
+    verify_group.add_argument('--quarantine', action='store_true', help='with "--verify", rename bad files to *.bad and drop them from the manifest, so the next run downloads them again')
+    verify_group.add_argument('--verify-workers', type=int, default=os.cpu_count(), help='number of processes hashing files at the same time, default is the number of CPUs')
+
+
+def add_verify_directory_arguments(parser):
+    parser.add_argument('root_directory', type=str, nargs='+', help='game directory containing .manifest.json')
+    parser.add_argument('--verify-workers', type=int, default=os.cpu_count(), help='number of processes hashing files at the same time, default is the number of CPUs')
+    parser.add_argument('--quarantine', action='store_true', help='if specified, bad files are renamed to *.bad and dropped from the manifest, so the next run downloads them again')
+
+
+def add_watch_arguments(parser):
+    watch_group = parser.add_argument_group('watch options')
+    watch_group.add_argument('--watch', type=float, metavar='INTERVAL', help='keep running, poll the challenge list every INTERVAL seconds and download challenges as they are released, retrying those that failed in the next poll')
+    watch_group.add_argument('--notify', type=str, metavar='COMMAND', help='shell command run for every challenge released or updated while watching, with CTF_GAME, CTF_CATEGORY, CTF_CHALL and CTF_EVENT (released or updated) in its environment')
+
+
+def add_search_arguments(parser):
+    parser.add_argument('query', nargs='+', help='words that must all appear, "rsa pad*" also finds padding')
+    parser.add_argument('-g', '--game', type=str, help='only games whose title contains GAME')
+    parser.add_argument('-c', '--category', type=str, help='only this category')
+    parser.add_argument('-n', '--limit', type=int, default=20, help='max number of hits, default is 20')
+    parser.add_argument('--json', action='store_true', help='print the hits as JSON lines')
+    parser.add_argument('--index', type=str, default=get_default_index_path(), metavar='FILE', help='the index, default is ~/.local/share/ctf_collect/index.sqlite')
+
+
+def add_index_command_arguments(parser, platforms: list):
+    subparsers = parser.add_subparsers(dest='index_command', required=True, metavar='COMMAND')
+    add_parser = subparsers.add_parser('add', help='index game directories downloaded before the index existed',
+                                       description='Index game directories downloaded before the index existed.')
+    add_parser.add_argument('root_directory', nargs='+', help='game directory, its name is taken as the game title')
+    add_parser.add_argument('-p', '--platform', choices=platforms, default='', help='platform the games were downloaded from, so a later download run updates the same entries')
+    add_parser.add_argument('--index', type=str, default=get_default_index_path(), metavar='FILE', help='the index, default is ~/.local/share/ctf_collect/index.sqlite')
+
+
+def add_serve_arguments(parser):
+    parser.add_argument('directory', type=str, help='directory containing the game directories to serve, only those with a manifest are served')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='address to listen on, default is 127.0.0.1 (this machine only), 0.0.0.0 shares on the LAN')
+    parser.add_argument('--port', type=int, default=8080, help='port to listen on, default is 8080')
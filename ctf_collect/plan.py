@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+from collections import defaultdict
+from urllib3.exceptions import NewConnectionError, MaxRetryError
+from ctf_collect.download import open_attachment, save_attachment, save_description
+from ctf_collect.index import start_index
+from ctf_collect.jobs import print, run_jobs
+from ctf_collect.manifest import Manifest
+from ctf_collect.metrics import count_chall, count_file
+from ctf_collect.mirror import start_mirror
+from ctf_collect.progress import format_size
+from ctf_collect.schedule import get_priority
+
+
+class Plan:
+    # everything a run would write, collected instead of downloaded
+
+    def __init__(self, game_title: str, manifest_path: str, token: str):
+        self.game_title = game_title
+        self.manifest_path = manifest_path
+        self.token = token
+        self.entries = []
+        self.lock = threading.Lock()
+
+    def add(self, **entry):
+        if 'url' in entry and self.token:
+            # the plan is a plain file, keep tokens that are part of download URLs out of it
+            entry['url'] = entry['url'].replace(self.token, '{token}')
+        with self.lock:
+            self.entries.append(entry)
+
+    def save(self, path: str):
+        # the plan may be executed from another working directory
+        entries = [dict(entry, path=os.path.abspath(entry['path'])) for entry in self.entries]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'game': self.game_title,
+                'manifest': os.path.abspath(self.manifest_path),
+                'entries': sorted(entries, key=lambda entry: entry['path']),
+            }, f, ensure_ascii=False, indent=1)
+
+    def print_totals(self):
+        files = defaultdict(int)
+        sizes = defaultdict(int)
+        unknown = defaultdict(int)
+        for entry in self.entries:
+            if entry['kind'] != 'attachment':
+                continue
+            files[entry['category']] += 1
+            if entry['size'] != -1:
+                sizes[entry['category']] += entry['size']
+            else:
+                unknown[entry['category']] += 1
+
+        for category in sorted(files) + ['total']:
+            count = sum(files.values()) if category == 'total' else files[category]
+            size = sum(sizes.values()) if category == 'total' else sizes[category]
+            unknown_count = sum(unknown.values()) if category == 'total' else unknown[category]
+            print('📦' if category == 'total' else '  ',
+                  category.ljust(12),
+                  f'{count} files'.ljust(10),
+                  format_size(size),
+                  f'+ {unknown_count} of unknown size' if unknown_count else '')
+
+        paths = defaultdict(list)
+        for entry in self.entries:
+            paths[entry['path']].append(entry)
+        for path, entries in sorted(paths.items()):
+            if len(entries) > 1:
+                print('⚠️', f'{len(entries)} files would be written to {path}:', ', '.join(f'{entry["category"]}/{entry["chall"]}' for entry in entries))
+
+
+def start_plan(args, game_title: str):
+    if args.dry_run is None:
+        return None
+    return Plan(game_title, args.manifest.path, args.token)
+
+
+def finish_plan(args):
+    args.plan.save(args.dry_run)
+    attachments = sum(entry['kind'] == 'attachment' for entry in args.plan.entries)
+    print('📋', f'Plan of {attachments} attachments and {len(args.plan.entries) - attachments} other files saved to {args.dry_run}, nothing was downloaded')
+    args.plan.print_totals()
+
+
+def execute_entry(args, session, entry: dict):
+    if entry['kind'] == 'challenge':
+        # deferred by the platform, which opens the attachment and picks its path itself
+        entry['download']()
+        return
+
+    title = f'{entry["category"]}/{entry["chall"]}'
+    path = entry['path']
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if entry['kind'] == 'description':
+            save_description(args, path, entry['content'], title)
+            return
+
+        exist_flag = os.path.exists(path)
+        if exist_flag and not args.overwrite and not args.manifest.is_tracked(entry['key']):
+            print('⏩', title.ljust(24), f'already exists: {path}')
+            count_file(args, title, 'exists')
+            return
+
+        response = open_attachment(args, session, entry['url'].replace('{token}', args.token), title, entry['key'], entry.get('sha256'))
+        if response is None:
+            return
+        save_attachment(args, session, response, path, entry['size'], title, exist_flag, entry['key'], entry['chall_id'], entry.get('sha256'))
+    except (MaxRetryError, NewConnectionError, ConnectionError, OSError):
+        print('❌', f'Failed to get challenge {entry["chall"]} file')
+        count_file(args, title, 'failed')
+    except Exception as e:
+        print('❌', f'Failed to get challenge {entry["chall"]}, error: {e}')
+        count_file(args, title, 'failed')
+
+
+def execute_entries(args, session, entries: list):
+    if args.order == 'priority':
+        # descriptions cost nothing, so they come before every attachment
+        entries = sorted(entries, key=lambda entry: (entry['kind'] != 'description', get_priority(args, entry)))
+    run_jobs(args, lambda entry: execute_entry(args, session, entry), entries)
+
+
+def execute_plan(args, session):
+    with open(args.execute, 'r', encoding='utf-8') as f:
+        plan = json.load(f)
+    args.manifest = Manifest(plan['manifest'])
+    args.plan = None
+    args.deferred = None
+    start_index(args, plan['game'])
+    start_mirror(args, plan['game'])
+    print('📋', f'Executing plan of {plan["game"]} with {len(plan["entries"])} files from {args.execute}')
+    for category, _ in {(entry['category'], entry['chall']) for entry in plan['entries']}:
+        count_chall(args, category)
+    execute_entries(args, session, plan['entries'])
+    return plan['game']
+
+
+def start_deferred(args, game_title: str):
+    # with --order priority, attachments that are large or of unknown size by the challenge info wait in a plan
+    # of their own until every challenge is resolved, so they cannot hold up descriptions and small files
+    if args.order != 'priority' or args.plan is not None:
+        return None
+    return Plan(game_title, args.manifest.path, args.token)
+
+
+def run_deferred(args, session):
+    if args.deferred is None:
+        return
+    entries = args.deferred.entries
+    args.deferred = None
+    execute_entries(args, session, entries)
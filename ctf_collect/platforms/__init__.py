@@ -0,0 +1,159 @@
+from ctf_collect.options import add_cache_arguments, add_download_arguments, add_extract_arguments, add_index_arguments, add_jobs_arguments, \
+    add_limit_arguments, add_metadata_arguments, add_metrics_arguments, add_mirror_arguments, add_plan_arguments, add_retry_arguments, \
+    add_schedule_arguments, add_session_arguments, add_store_arguments, add_trace_arguments, add_verify_arguments, add_watch_arguments
+
+# the arguments of every platform live here, so a parser is built without importing a platform module and the HTTP stack behind it
+
+CATEGORIES = ['misc', 'crypto', 'pwn', 'web', 'reverse', 'blockchain', 'forensics', 'hardware', 'mobile', 'ppc', 'ai']
+
+
+def add_common_arguments(parser, game: str = 'LRCTF 2024', category: str = 'misc'):
+    parser.add_argument('-d', '--root-directory', type=str, default='{game}', help=f'default is `pwd`/{{game}}, which can generate "./{game}"')
+    parser.add_argument('-f', '--file-path', type=str, default='{category}/{chall}/{origin}', help=f'style of file path, default is {{category}}/{{chall}}/{{origin}}, which can generate "{category}/sign in/attachment_deadbeef.zip"; ends with "{{origin}}" to keep extension suffix')
+
+    # {game}      received game title, e.g. "BaseCTF 2024"
+    # {category}  "direction" in lowercase, e.g. "misc"
+    # {chall}     received challenge name, e.g. "sign in"
+    # {origin}    received file name, e.g. "attachment_deadbeef.zip"
+
+    parser.add_argument('-k', '--keep-spaces', action="store_true", help='if specified, spaces in "--file-path" will not be replaced by "-"')
+    parser.add_argument('-s', '--max-size', type=float, default=50.0, help='max file size in MB, larger than this will be skipped, default is 50.0, set to 0 to disable')
+    parser.add_argument('-o', '--overwrite', action="store_true", help='if specified, existing files will be replaced instead of skipped')
+    add_cache_arguments(parser)
+    add_download_arguments(parser)
+    add_extract_arguments(parser)
+    add_index_arguments(parser)
+    add_jobs_arguments(parser)
+    add_limit_arguments(parser)
+    add_metadata_arguments(parser)
+    add_metrics_arguments(parser)
+    add_mirror_arguments(parser)
+    add_plan_arguments(parser)
+    add_retry_arguments(parser)
+    add_schedule_arguments(parser)
+    add_session_arguments(parser)
+    add_store_arguments(parser)
+    add_trace_arguments(parser)
+    add_verify_arguments(parser)
+    add_watch_arguments(parser)
+
+    tag_group = parser.add_argument_group('category options, default is ALL, you can specify like -mwp')
+    tag_group.add_argument('-E', '--except-mode', action="store_true", help='e.g. -p means ONLY download pwn, while -E -p means download everything else EXCEPT pwn')
+    tag_group.add_argument('-m', '--misc', action='store_true')
+    tag_group.add_argument('-c', '--crypto', action='store_true')
+    tag_group.add_argument('-p', '--pwn', action='store_true')
+    tag_group.add_argument('-w', '--web', action='store_true')
+    tag_group.add_argument('-r', '--reverse', action='store_true')
+    tag_group.add_argument('--blockchain', action='store_true')
+    tag_group.add_argument('--forensics', action='store_true')
+    tag_group.add_argument('--hardware', action='store_true')
+    tag_group.add_argument('--mobile', action='store_true')
+    tag_group.add_argument('--ppc', action='store_true')
+    tag_group.add_argument('--ai', action='store_true')
+
+
+def check_common_args(args):
+    args.max_size = args.max_size * 1024 * 1024 if args.max_size > 0 else float('inf')
+    args.segment_threshold = args.segment_threshold * 1024 * 1024
+
+    allowlist = CATEGORIES.copy()
+    if any(getattr(args, category) for category in CATEGORIES):
+        for category in CATEGORIES:
+            if bool(getattr(args, category)) ^ (not args.except_mode):
+                allowlist.remove(category)
+
+    args.allowlist = allowlist
+
+
+def add_gzctf_arguments(parser):
+    parser.add_argument('-u', '--url', type=str, help='GZ::CTF game URL, e.g. https://example.com/games/1/challenges or https://example.com/games/1')
+    parser.add_argument('-t', '--token', type=str, help='value of Cookie GZCTF_Token')
+    add_common_arguments(parser)
+
+
+def check_gzctf_args(args):
+    if args.url is None:
+        args.url = input('\nEnter game URL here, e.g.\n\thttps://example.com/games/1/challenges\n\thttps://example.com/games/1\n').strip()
+    args.url = args.url.split(' ')[0] \
+                       .replace('/challenges', '') \
+                       .replace('/scoreboard', '') \
+                       .replace('/games/', '/api/game/') \
+                       .rstrip('/')
+    # https://example.com/api/game/1
+
+    if args.token is None:
+        args.token = input('\nPaste GZCTF_Token Cookie value here: ').strip()
+    args.token = args.token.replace('GZCTF_Token=', '').strip()
+
+
+def add_cyberpeace_arguments(parser):
+    parser.add_argument('-u', '--url', type=str, help='CyberPeace game URL, e.g. https://challenge.xctf.org.cn/page/mg/ct/contest/flag/0123456789abcdef0123456789abcdef/ContestPage')
+    parser.add_argument('-t', '--token', type=str, help='value of JWT token')
+    add_common_arguments(parser)
+
+
+def check_cyberpeace_args(args):
+    if args.url is None:
+        args.url = input('\nEnter game URL here, e.g.\n\thttps://challenge.xctf.org.cn/page/mg/ct/contest/flag/0123456789abcdef0123456789abcdef/ContestPage\n').strip()
+    args.url = args.url.split(' ')[0] \
+                       .replace('page/mg/ct/contest/flag/', 'api/ct/web/jeopardy_race/race/') \
+                       .replace('/ContestPage', '') \
+                       .replace('/GuidePage', '') \
+                       .replace('/RankList', '') \
+                       .replace('/TrendPage', '') \
+                       .rstrip('/')
+    # https://challenge.xctf.org.cn/api/ct/web/jeopardy_race/race/0123456789abcdef0123456789abcdef
+
+    if args.token is None:
+        args.token = input('\nPaste JWT token value here: ').strip()
+    args.token = args.token.replace('JWT ', '').strip()
+
+
+def add_ret2shell_arguments(parser):
+    parser.add_argument('-u', '--url', type=str, help='Ret2Shell game URL, e.g. https://example.com/games/1/challenges or https://example.com/games/1')
+    parser.add_argument('-t', '--token', type=str, help='value of Local Storage account.token')
+    add_common_arguments(parser)
+
+
+def check_ret2shell_args(args):
+    if args.url is None:
+        args.url = input('\nEnter game URL here, e.g.\n\thttps://example.com/games/1/challenges\n\thttps://example.com/games/1\n').strip()
+    args.url = args.url.split(' ')[0] \
+                       .replace('/challenges', '') \
+                       .replace('/scoreboard', '') \
+                       .replace('/games/', '/api/game/') \
+                       .rstrip('/')
+    # https://example.com/api/game/1
+
+    if args.token is None:
+        args.token = input('\nPaste Local Storage account.token value here: ').strip()
+    args.token = args.token.replace('Bearer ', '').strip()
+
+
+def add_nu1l_arguments(parser):
+    parser.add_argument('-u', '--url', type=str, help='CTF platform domain, e.g. https://ctf.junior.nu1l.com or https://ctf.junior.nu1l.com/challenges')
+    parser.add_argument('-t', '--token', type=str, help='value of Local Storage user.token')
+    add_common_arguments(parser, 'N1CTF 2025', 'reverse')
+
+
+def check_nu1l_args(args):
+    if args.url is None:
+        args.url = input('\nEnter game URL here, e.g.\n\thttps://ctf.junior.nu1l.com\n\thttps://ctf.junior.nu1l.com/challenges\n').strip()
+    args.url = args.url.split(' ')[0] \
+                       .rstrip('/') \
+                       .replace('/challenges', '') \
+                       .replace('/leaderboard', '') \
+                       .rstrip('/') + '/api'
+    # https://example.com/api
+
+    if args.token is None:
+        args.token = input('\nPaste Local Storage user.token value here: ').strip()
+
+
+# subcommand -> (description, arguments, checks after parsing); the module ctf_collect.platforms.<subcommand> downloads
+PLATFORMS = {
+    'gzctf': ('A GZ::CTF attachment downloader.', add_gzctf_arguments, check_gzctf_args),
+    'cyberpeace': ('A CyberPeace (xctf.org.cn) attachment downloader.', add_cyberpeace_arguments, check_cyberpeace_args),
+    'ret2shell': ('A Ret2Shell attachment downloader.', add_ret2shell_arguments, check_ret2shell_args),
+    'nu1l': ('A CTF platform (Nu1L CTFPunk) attachment downloader.', add_nu1l_arguments, check_nu1l_args),
+}
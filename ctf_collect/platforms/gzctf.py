@@ -0,0 +1,325 @@
+import os
+import re
+import sys
+from urllib3.exceptions import NewConnectionError, MaxRetryError
+from ctf_collect.download import get_content_file_name, get_content_size, open_attachment, save_attachment, save_description
+from ctf_collect.extract import finish_extract
+from ctf_collect.index import start_index
+from ctf_collect.jobs import print, run_jobs
+from ctf_collect.manifest import load_manifest
+from ctf_collect.metadata import iter_metadata
+from ctf_collect.metrics import count_chall, count_file, finish_metrics, track_chall
+from ctf_collect.mirror import start_mirror
+from ctf_collect.plan import execute_plan, finish_plan, run_deferred, start_deferred, start_plan
+from ctf_collect.schedule import defer_chall
+from ctf_collect.session import create_session
+from ctf_collect.verify import verify_manifest
+from ctf_collect.watch import watch_challs
+# import traceback
+
+class RemoteURLPointsToHTML(Exception):
+    def __init__(self, message="The remote URL points to an HTML document"):
+        self.message = message
+        super().__init__(self.message)
+
+def get_challs(args):
+    headers = {
+        'Cookie': f'GZCTF_Token={args.token}',
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36 Edg/125.0.0.0',
+    }
+    session = create_session(args, headers)
+
+    if args.execute:
+        game_title = execute_plan(args, session)
+        finish_extract(args)
+        print('🎉', 'All done.')
+        finish_metrics(args, game_title)
+        return
+
+    # get game title
+    response = session.get(args.url)
+    if response.status_code != 200:
+        print('❌', f'Failed to get game title from {args.url}, status code: {response.status_code}')
+        sys.exit(1)
+
+    game_info = response.json()
+    game_title = game_info['title']
+    args.manifest = load_manifest(args, game_title)
+    if args.verify:
+        if verify_manifest(args, args.manifest):
+            sys.exit(1)
+        return
+    args.plan = start_plan(args, game_title)
+    start_index(args, game_title)
+    start_mirror(args, game_title)
+
+    if args.watch and args.plan is None:
+        watch_challs(args, game_title,
+                     lambda: get_chall_list(args, session),
+                     lambda objects: download_challs(args, objects, session, game_title),
+                     lambda object: (object["id"], object['category'].lower(), object['title']))
+    else:
+        objects = get_chall_list(args, session)
+        if objects is None:
+            sys.exit(1)
+        download_challs(args, objects, session, game_title)
+
+    if args.plan is not None:
+        finish_plan(args)
+        return
+
+    finish_extract(args)
+    print('🎉', 'All done.')
+    finish_metrics(args, game_title)
+
+def get_chall_list(args, session):
+
+    # get challenge list
+    url_details = args.url + '/details'
+    response = session.get(url_details)
+    if response.status_code != 200:
+        print('❌', f'Failed to get challenge list from {url_details}, status code: {response.status_code}')
+        return None
+
+    response_data = response.json()
+    return [dict(object, category=object.get('category') or group)
+            for group in response_data['challenges'] if group.lower() in args.allowlist
+            for object in response_data['challenges'][group]]
+
+def download_challs(args, objects: list, session, game_title: str):
+    infos = iter_metadata(objects, lambda object: get_chall_info(args, object["id"], session), args.metadata_concurrency)
+    args.deferred = start_deferred(args, game_title)
+    run_jobs(args, lambda entry: get_one_chall_safe(args, entry, session, game_title), infos)
+    run_deferred(args, session)
+    return args.metrics.pop_failed_challs()
+
+def get_one_chall_safe(args, entry, session, game_title: str, deferred: bool = False):
+    object, info, error = entry
+    category = object['category']
+    if not deferred:
+        count_chall(args, category)
+    with track_chall(object["id"]):
+        try:
+            if error is not None:
+                raise error
+            if info is None:
+                count_file(args, category, 'failed')
+            else:
+                get_one_chall(args, info, session, game_title, lambda: get_one_chall_safe(args, entry, session, game_title, True))
+        except (MaxRetryError, NewConnectionError, ConnectionError, OSError):
+            print('❌', f'Failed to get challenge {object["id"]} file, try to save the download URL...')
+            count_file(args, category, 'failed')
+            get_one_chall_download_error(args, object["id"], session, game_title, info)
+        except RemoteURLPointsToHTML:
+            print('❌','The remote URL points to an HTML document, try to save the download URL...')
+            count_file(args, category, 'failed')
+            get_one_chall_download_error(args, object["id"], session, game_title, info)
+        except Exception as e:
+            print('❌', f'Failed to get challenge {object["id"]}, error: {e}')
+            count_file(args, category, 'failed')
+            # traceback.print_exc()
+
+def get_chall_info(args, id: int, session):
+
+    # get attachment info, including URL
+
+    url_chall_id = f'{args.url}/challenges/{id}'
+    response = session.get(url_chall_id)
+    if response.status_code != 200:
+        print('❌', f'Failed to get challenge info from {url_chall_id}, status code: {response.status_code}')
+        return None
+
+    return response.json()
+
+def get_one_chall(args, response_data: dict, session, game_title: str, download_later=None):
+
+    name = response_data['title']
+    category = (response_data.get('category') or response_data.get('tag')).lower()
+    remote_path = response_data['context']['url']         # may be relative or absolute
+    info_size = response_data['context']['fileSize']      # may be null
+    content = response_data['content']
+    chal_type = response_data['type']
+    content += f'\n\nChallenge Type: {chal_type}'
+    cant_download = False
+
+    if remote_path is None:
+        print('⏩', f'{category}/{name}'.ljust(24), 'has no attachment')
+        count_file(args, category, 'no_attachment')
+        content+=f' \n\nthis challenge has no attachment'
+        cant_download = True
+
+    if info_size is not None and info_size > args.max_size:
+        print('🤯', f'{category}/{name}'.ljust(24), f'is too large ({format(info_size, ",")} bytes)')
+        count_file(args, category, 'too_large')
+        content+=f'\n\nthis attachment is too large ({format(info_size, ",")} bytes), try use the url in download_URL.txt'
+        cant_download = True
+    if cant_download == False:
+        if re.match(r'^https?://', remote_path):
+            url_file_content = remote_path
+        else:
+            url_file_content = re.sub(r'/api/game/.*$', remote_path, args.url)
+    # large or of unknown size: the description is written now, next to the attachment named as in its URL
+    deferred = cant_download == False and defer_chall(args, category, name, -1 if info_size is None else info_size, download_later)
+    # get attachment file name and size
+    if cant_download == False and not deferred:
+        # GZ::CTF serves attachments from /assets/<sha256>/<name>, so stored bytes are found without downloading
+        asset_hash = re.search(r'/assets/([0-9a-f]{64})/', url_file_content)
+        response = open_attachment(args, session, url_file_content, f'{category}/{name}', sha256=asset_hash.group(1) if asset_hash else None)
+        if response is None:
+            return
+
+        if 'text/html' in response.headers.get('Content-Type', ''):
+            response.close()
+            print('❔', f'{category}/{name}'.ljust(24), f'Content-Type: text/html, URL: {url_file_content}')
+            # not return
+            raise RemoteURLPointsToHTML
+
+        origin_size = get_content_size(response)
+        size = origin_size if info_size is None else max(info_size, origin_size)
+
+        origin_file_name = get_content_file_name(response, url_file_content.split('/')[-1])
+
+    # format path string, check file existence, and create directory
+    if cant_download == True:
+        origin_file_name = "tmp_file_name"
+    elif deferred:
+        origin_file_name = url_file_content.split('/')[-1]
+    file_path = args.file_path \
+                    .strip() \
+                    .lstrip('/\\') \
+                    .format(game=game_title, tag=category, category=category, chall=name, origin=origin_file_name)
+    if not args.keep_spaces:
+        file_path = re.sub(r'\s+', '-', file_path)
+    file_path = re.sub(r'[:*?"<>|]', '_', file_path)
+
+    root_directory = args.root_directory \
+                         .strip() \
+                         .rstrip('/\\') \
+                         .format(game=game_title, tag=category, category=category, chall=name, origin=origin_file_name)
+    root_directory = re.sub(r'[*?"<>|]', '_', root_directory)
+    
+    local_path = f'{root_directory}/{file_path}'
+
+    exist_flag = os.path.exists(local_path)
+    if exist_flag and not args.overwrite and not deferred and (cant_download or not args.manifest.is_tracked(url_file_content)):
+        if cant_download == False:
+            response.close()
+            count_file(args, category, 'exists')
+        print('⏩', f'{category}/{name}'.ljust(24), f'already exists: {local_path}')
+        return
+
+    if args.plan is None:
+        local_dir = os.path.dirname(local_path)
+        os.makedirs(local_dir, exist_ok=True)
+
+    dir_path = '/'.join(file_path.split('/')[:-1])
+    save_description(args, f'{root_directory}/{dir_path}/description.txt', content, f'{category}/{name}')
+    # download attachment
+    if cant_download == True or deferred:
+        return
+    save_attachment(args, session, response, local_path, size, f'{category}/{name}', exist_flag, url_file_content, response_data.get('id'),
+                    asset_hash.group(1) if asset_hash else None)
+
+def get_one_chall_download_error(args, id: int, session, game_title: str, response_data: dict = None):
+
+    # get attachment info, including URL, unless it was fetched before the download failed
+    if response_data is None:
+        url_chall_id = f'{args.url}/challenges/{id}'
+        response = session.get(url_chall_id)
+        if response.status_code != 200:
+            print('❌', f'Failed to get challenge info from {url_chall_id}, status code: {response.status_code}')
+            return
+        response_data = response.json()
+
+    name = response_data['title']
+    category = (response_data.get('category') or response_data.get('tag')).lower()
+    remote_path = response_data['context']['url']         # may be relative or absolute
+    info_size = response_data['context']['fileSize']      # may be null
+    content = response_data['content']
+    chal_type = response_data['type']
+    content += f'\n\nChallenge Type: {chal_type}'
+    cant_download = True
+
+    if remote_path is None:
+        print('⏩', f'{category}/{name}'.ljust(24), 'has no attachment')
+        content+=f' \n\nthis challenge has no attachment'
+        cant_download = True
+
+    if info_size is not None and info_size > args.max_size:
+        print('🤯', f'{category}/{name}'.ljust(24), f'is too large ({format(info_size, ",")} bytes)')
+        content+=f'\n\nthis attachment is too large ({format(info_size, ",")} bytes), try use the url in download_URL.txt'
+        cant_download = True
+    # get attachment file name and size
+
+    if cant_download == False:
+        if re.match(r'^https?://', remote_path):
+            url_file_content = remote_path
+        else:
+            url_file_content = re.sub(r'/api/game/.*$', remote_path, args.url)
+        response = session.get(url_file_content, headers={'Range': 'bytes=0-10'}, stream=True)
+        response.close()     # only headers are needed, give the connection back to the pool
+        if response.status_code not in (200, 206):
+            print('❌', f'{category}/{name}'.ljust(24), f'Failed to get attachment info from {url_file_content}, status code: {response.status_code}')
+            return
+        
+        if 'text/html' in response.headers.get('Content-Type', ''):
+            print('❔', f'{category}/{name}'.ljust(24), f'Content-Type: text/html, URL: {url_file_content}')
+            # not return
+
+        origin_size = int(response.headers.get('Content-Range', '0-0/-1').split('/')[-1])
+        if origin_size == -1:
+            try:
+                origin_size = int(response.headers['Content-Length'])
+            except:
+                origin_size = -1
+        if origin_size != -1 and origin_size > args.max_size:
+            print('🤯', f'{category}/{name}'.ljust(24), f'is too large ({format(origin_size, ",")} bytes)')
+            return
+        
+        size = origin_size if info_size is None else max(info_size, origin_size)
+
+        origin_file_name = response.headers.get('Content-Disposition', 'filename=NONE') \
+                                        .split('filename=')[1] \
+                                        .split(';')[0] \
+                                        .strip('"')
+        if origin_file_name == 'NONE':
+            origin_file_name = url_file_content.split('/')[-1]
+
+    # format path string, check file existence, and create directory
+
+    if cant_download == True:
+        origin_file_name = "tmp_file_name"
+    file_path = args.file_path \
+                    .strip() \
+                    .lstrip('/\\') \
+                    .format(game=game_title, tag=category, category=category, chall=name, origin=origin_file_name)
+    if not args.keep_spaces:
+        file_path = re.sub(r'\s+', '-', file_path)
+    file_path = re.sub(r'[:*?"<>|]', '_', file_path)
+
+    root_directory = args.root_directory \
+                         .strip() \
+                         .rstrip('/\\') \
+                         .format(game=game_title, tag=category, category=category, chall=name, origin=origin_file_name)
+    root_directory = re.sub(r'[*?"<>|]', '_', root_directory)
+    
+    local_path = f'{root_directory}/{file_path}'
+
+    exist_flag = os.path.exists(local_path)
+    if exist_flag and not args.overwrite:
+        print('⏩', f'{category}/{name}'.ljust(24), f'already exists: {local_path}')
+        return
+
+    if args.plan is None:
+        local_dir = os.path.dirname(local_path)
+        os.makedirs(local_dir, exist_ok=True)
+    # print(file_path)
+    save_dir = f'{root_directory}/' + '/'.join(file_path.split('/')[:-1])
+    # dir_path = 
+    save_description(args, f'{save_dir}/description.txt', content, f'{category}/{name}')
+    save_description(args, f'{save_dir}/download_URL.txt', remote_path, f'{category}/{name}')
+    # download attachment
+    print('\r✅',
+          f'{category}/{name}'.ljust(24),
+          f'saved download URL to {save_dir}/download_URL.txt',
+          '[overwritten]' if exist_flag else '')
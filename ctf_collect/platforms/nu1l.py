@@ -0,0 +1,209 @@
+import os
+import re
+import sys
+from urllib3.exceptions import NewConnectionError, MaxRetryError
+from ctf_collect.download import open_attachment, save_attachment, save_description
+from ctf_collect.extract import finish_extract
+from ctf_collect.index import start_index
+from ctf_collect.jobs import print, run_jobs
+from ctf_collect.manifest import load_manifest
+from ctf_collect.metadata import iter_metadata
+from ctf_collect.metrics import count_chall, count_file, finish_metrics, track_chall
+from ctf_collect.mirror import start_mirror
+from ctf_collect.plan import execute_plan, finish_plan, run_deferred, start_deferred, start_plan
+from ctf_collect.schedule import defer_chall
+from ctf_collect.session import create_session
+from ctf_collect.verify import verify_manifest
+from ctf_collect.watch import watch_challs
+# import traceback
+
+
+def get_challs(args):
+    headers = {
+        'Authorization': args.token,
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36 Edg/125.0.0.0',
+    }
+    session = create_session(args, headers)
+
+    if args.execute:
+        game_title = execute_plan(args, session)
+        finish_extract(args)
+        print('🎉', 'All done.')
+        finish_metrics(args, game_title)
+        return
+
+    # get game title
+    portal_id_url = f'{args.url}/competitions/converter:code2id?code=portal'
+    response = session.get(portal_id_url)
+    if response.status_code != 200:
+        print('❌', f'Failed to get game id from {portal_id_url}, status code: {response.status_code}')
+        sys.exit(1)
+    portal_id = response.json()['data']['id']
+
+    game_info_url = f'{args.url}/competitions/{portal_id}'
+    response = session.get(game_info_url)
+    if response.status_code != 200:
+        print('❌', f'Failed to get game info from {game_info_url}, status code: {response.status_code}')
+        sys.exit(1)
+    game_info = response.json()
+    game_title = game_info['data']['title']
+    args.manifest = load_manifest(args, game_title)
+    if args.verify:
+        if verify_manifest(args, args.manifest):
+            sys.exit(1)
+        return
+    args.plan = start_plan(args, game_title)
+    start_index(args, game_title)
+    start_mirror(args, game_title)
+
+    if args.watch and args.plan is None:
+        watch_challs(args, game_title,
+                     lambda: get_chall_list(args, session, portal_id),
+                     lambda objects: download_challs(args, objects, session, game_title, portal_id),
+                     lambda object: (object['id'], object['categories'][0].lower() if object.get('categories') else 'none', object['name']))
+    else:
+        objects = get_chall_list(args, session, portal_id)
+        if objects is None:
+            sys.exit(1)
+        download_challs(args, objects, session, game_title, portal_id)
+
+    if args.plan is not None:
+        finish_plan(args)
+        return
+
+    finish_extract(args)
+    print('🎉', 'All done.')
+    finish_metrics(args, game_title)
+
+
+def get_chall_list(args, session, portal_id: str):
+
+    # get challenge list
+    url_details = f'{args.url}/competitions/{portal_id}/challenges'
+    response = session.get(url_details)
+    if response.status_code != 200:
+        print('❌', f'Failed to get challenge list from {url_details}, status code: {response.status_code}')
+        return None
+
+    response_data = response.json()['data']['challenges']
+    return [object for object in response_data
+                   if not object.get('categories') or object['categories'][0].lower() in args.allowlist]
+
+
+def download_challs(args, objects: list, session, game_title: str, portal_id: str):
+    infos = iter_metadata(objects, lambda object: get_chall_info(args, object['id'], session, portal_id), args.metadata_concurrency)
+    args.deferred = start_deferred(args, game_title)
+    run_jobs(args, lambda entry: get_one_chall_safe(args, entry, session, game_title, portal_id), infos)
+    run_deferred(args, session)
+    return args.metrics.pop_failed_challs()
+
+
+def get_one_chall_safe(args, entry, session, game_title: str, portal_id: str, deferred: bool = False):
+    object, info, error = entry
+    category = object['categories'][0] if object.get('categories') else 'none'
+    if not deferred:
+        count_chall(args, category)
+    with track_chall(object['id']):
+        try:
+            if error is not None:
+                raise error
+            if info is None:
+                count_file(args, category, 'failed')
+            else:
+                get_one_chall(args, object['id'], info, session, game_title, portal_id,
+                              lambda: get_one_chall_safe(args, entry, session, game_title, portal_id, True))
+        except (MaxRetryError, NewConnectionError, ConnectionError, OSError):
+            print('❌', f'Failed to get challenge {object['name']} file')
+            count_file(args, category, 'failed')
+        except Exception as e:
+            print('❌', f'Failed to get challenge {object['name']}, error: {e}')
+            count_file(args, category, 'failed')
+            # traceback.print_exc()
+
+
+def get_absolute_path(args, game_title: str, category: str, chall_name: str, origin_file_name: str, tracked: bool = False):
+    file_path = args.file_path \
+                    .strip() \
+                    .lstrip('/\\') \
+                    .format(game=game_title, tag=category, category=category, chall=chall_name, origin=origin_file_name)
+    if not args.keep_spaces:
+        file_path = re.sub(r'\s+', '-', file_path)
+    file_path = re.sub(r'[:*?"<>|]', '_', file_path)
+
+    root_directory = args.root_directory \
+                        .strip() \
+                        .rstrip('/\\') \
+                        .format(game=game_title, tag=category, category=category, chall=chall_name, origin=origin_file_name)
+    root_directory = re.sub(r'[*?"<>|]', '_', root_directory)
+
+    local_path = f'{root_directory}/{file_path}'
+
+    exist_flag = os.path.exists(local_path)
+    # files known to the manifest are revalidated instead of skipped
+    if exist_flag and not args.overwrite and not tracked and origin_file_name != 'README.md':
+        print('⏩', f'{category}/{chall_name}'.ljust(24), f'already exists: {local_path}')
+        count_file(args, category, 'exists')
+        return None, exist_flag
+
+    if args.plan is None:
+        local_dir = os.path.dirname(local_path)
+        os.makedirs(local_dir, exist_ok=True)
+
+    return local_path, exist_flag
+
+
+def get_chall_info(args, id: str, session, portal_id: str):
+
+    # get attachment info, including URL
+
+    url_chall_id = f'{args.url}/competitions/{portal_id}/challenges/{id}'
+    response = session.get(url_chall_id)
+    if response.status_code != 200:
+        print('❌', f'Failed to get challenge info from {url_chall_id}, status code: {response.status_code}')
+        return None
+
+    return response.json()['data']
+
+
+def get_one_chall(args, id: str, response_data: dict, session, game_title: str, portal_id: str, download_later=None):
+    name = response_data['title']
+    category = response_data['categories'][0].lower() if response_data.get('categories') else 'none'
+    content = response_data['description']
+    attachment = response_data.get('attachment')
+
+    # challenge README.md content
+    file_path, exist_flag = get_absolute_path(args, game_title, category, name, 'README.md')
+    if file_path:
+        save_description(args, file_path, content, f'{category}/{name}')
+
+    if attachment is None or attachment.get('filename') is None:
+        print('⏩', f'{category}/{name}'.ljust(24), 'has no attachment')
+        count_file(args, category, 'no_attachment')
+        return
+
+    size = attachment.get('size', -1)
+
+    if size != -1 and size > args.max_size:
+        print('🤯', f'{category}/{name}'.ljust(24), f'is too large ({format(size, ",")} bytes)')
+        count_file(args, category, 'too_large')
+        return
+
+    file_name = attachment['filename']
+
+    # the token is part of the download URL, so the manifest keys attachments without it
+    url_attachment = f'{args.url}/competitions/{portal_id}/challenges/{id}/attachments:download'
+    url_file_content = f'{url_attachment}?token={args.token}'
+
+    local_path, exist_flag = get_absolute_path(args, game_title, category, name, file_name, args.manifest.is_tracked(url_attachment))
+    if local_path is None:
+        return
+    # large attachments wait for their turn without being requested
+    if defer_chall(args, category, name, size, download_later):
+        return
+
+    # download attachment, the size is already known from the platform so no probe is needed
+    response = open_attachment(args, session, url_file_content, f'{category}/{name}', url_attachment)
+    if response is None:
+        return
+
+    save_attachment(args, session, response, local_path, size, f'{category}/{name}', exist_flag, url_attachment, id)
@@ -0,0 +1,210 @@
+import os
+import re
+import sys
+from urllib3.exceptions import NewConnectionError, MaxRetryError
+from ctf_collect.download import get_content_file_name, get_content_size, open_attachment, save_attachment, save_description
+from ctf_collect.extract import finish_extract
+from ctf_collect.index import start_index
+from ctf_collect.jobs import print, run_jobs
+from ctf_collect.manifest import load_manifest
+from ctf_collect.metadata import iter_metadata
+from ctf_collect.metrics import count_chall, count_file, finish_metrics, track_chall
+from ctf_collect.mirror import start_mirror
+from ctf_collect.plan import execute_plan, finish_plan, run_deferred, start_deferred, start_plan
+from ctf_collect.schedule import defer_chall
+from ctf_collect.session import create_session
+from ctf_collect.verify import verify_manifest
+from ctf_collect.watch import watch_challs
+# import traceback
+
+
+def get_challs(args):
+    headers = {
+        'Authorization': f'Bearer {args.token}',
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36 Edg/125.0.0.0',
+    }
+    session = create_session(args, headers)
+
+    if args.execute:
+        game_title = execute_plan(args, session)
+        finish_extract(args)
+        print('🎉', 'All done.')
+        finish_metrics(args, game_title)
+        return
+
+    # get game title
+    response = session.get(args.url)
+    if response.status_code != 200:
+        print('❌', f'Failed to get game title from {args.url}, status code: {response.status_code}')
+        sys.exit(1)
+
+    game_info = response.json()
+    game_title = game_info['name']
+    args.manifest = load_manifest(args, game_title)
+    if args.verify:
+        if verify_manifest(args, args.manifest):
+            sys.exit(1)
+        return
+    args.plan = start_plan(args, game_title)
+    start_index(args, game_title)
+    start_mirror(args, game_title)
+
+    if args.watch and args.plan is None:
+        watch_challs(args, game_title,
+                     lambda: get_chall_list(args, session),
+                     lambda objects: download_challs(args, objects, session, game_title),
+                     lambda object: (object['id'], get_primary_tag(object), object.get('name', object['id'])))
+    else:
+        objects = get_chall_list(args, session)
+        if objects is None:
+            sys.exit(1)
+        download_challs(args, objects, session, game_title)
+
+    if args.plan is not None:
+        finish_plan(args)
+        return
+
+    finish_extract(args)
+    print('🎉', 'All done.')
+    finish_metrics(args, game_title)
+
+
+def get_chall_list(args, session):
+
+    # get challenge list
+    url_details = args.url + '/challenge?'
+    response = session.get(url_details)
+    if response.status_code != 200:
+        print('❌', f'Failed to get challenge list from {url_details}, status code: {response.status_code}')
+        return None
+
+    response_data = response.json()
+    # the list already tells the category, so challenges outside the allowlist are never fetched nor counted
+    return [object for object in response_data[0] if get_primary_tag(object) in args.allowlist]
+
+
+def get_primary_tag(object):
+    return next((t['name'].lower() for t in object.get('tag', []) if t['primary'] == True), 'unknown')
+
+
+def download_challs(args, objects: list, session, game_title: str):
+    infos = iter_metadata(objects, lambda object: get_chall_info(args, object['id'], session), args.metadata_concurrency)
+    args.deferred = start_deferred(args, game_title)
+    run_jobs(args, lambda entry: get_one_chall_safe(args, entry, session, game_title), infos)
+    run_deferred(args, session)
+    return args.metrics.pop_failed_challs()
+
+
+def get_one_chall_safe(args, entry, session, game_title: str, deferred: bool = False):
+    object, info, error = entry
+    category = get_primary_tag(object)
+    if not deferred:
+        count_chall(args, category)
+    with track_chall(object['id']):
+        try:
+            if error is not None:
+                raise error
+            if info is None:
+                count_file(args, category, 'failed')
+            else:
+                get_one_chall(args, object['id'], info, session, game_title, lambda: get_one_chall_safe(args, entry, session, game_title, True))
+        except (MaxRetryError, NewConnectionError, ConnectionError, OSError):
+            print('❌', f'Failed to get challenge {object['name']} file')
+            count_file(args, category, 'failed')
+        except Exception as e:
+            print('❌', f'Failed to get challenge {object['name']}, error: {e}')
+            count_file(args, category, 'failed')
+            # traceback.print_exc()
+
+
+def get_absolute_path(args, game_title: str, category: str, chall_name: str, origin_file_name: str, tracked: bool = False):
+    file_path = args.file_path \
+                    .strip() \
+                    .lstrip('/\\') \
+                    .format(game=game_title, tag=category, category=category, chall=chall_name, origin=origin_file_name)
+    if not args.keep_spaces:
+        file_path = re.sub(r'\s+', '-', file_path)
+    file_path = re.sub(r'[:*?"<>|]', '_', file_path)
+
+    root_directory = args.root_directory \
+                        .strip() \
+                        .rstrip('/\\') \
+                        .format(game=game_title, tag=category, category=category, chall=chall_name, origin=origin_file_name)
+    root_directory = re.sub(r'[*?"<>|]', '_', root_directory)
+
+    local_path = f'{root_directory}/{file_path}'
+
+    exist_flag = os.path.exists(local_path)
+    # files known to the manifest are revalidated instead of skipped
+    if exist_flag and not args.overwrite and not tracked and origin_file_name != 'README.md':
+        print('⏩', f'{category}/{chall_name}'.ljust(24), f'already exists: {local_path}')
+        count_file(args, category, 'exists')
+        return None, exist_flag
+
+    if args.plan is None:
+        local_dir = os.path.dirname(local_path)
+        os.makedirs(local_dir, exist_ok=True)
+
+    return local_path, exist_flag
+
+
+def get_chall_info(args, id: int, session):
+
+    # get attachment info, including URL
+
+    url_chall_id = f'{args.url}/challenge/{id}'
+    response = session.get(url_chall_id)
+    if response.status_code != 200:
+        print('❌', f'Failed to get challenge info from {url_chall_id}, status code: {response.status_code}')
+        return None
+
+    chall_data = response.json()
+
+    url_chall_file = f'{args.url}/challenge/{id}/file?'
+    response = session.get(url_chall_file)
+    if response.status_code != 200:
+        print('❌', f'Failed to get challenge file info from {url_chall_file}, status code: {response.status_code}')
+        return None
+
+    return chall_data, response.json()
+
+
+def get_one_chall(args, id: int, info: tuple, session, game_title: str, download_later=None):
+    chall_data, response_data = info
+    name = chall_data['name']
+    category = [t['name'].lower() for t in chall_data['tag'] if t['primary'] == True][0]
+    content = chall_data['content']
+
+    # challenge README.md content
+
+    file_path, exist_flag = get_absolute_path(args, game_title, category, name, 'README.md')
+    if file_path:
+        save_description(args, file_path, content, f'{category}/{name}')
+
+    if len(response_data) == 0:
+        print('⏩', f'{category}/{name}'.ljust(24), 'has no attachment')
+        count_file(args, category, 'no_attachment')
+        return
+    # the challenge info has neither sizes nor names, so the attachments wait for their turn without being requested
+    if defer_chall(args, category, name, -1, download_later):
+        return
+
+    # foreach attachment file
+
+    for file in response_data:
+        url_file_content = f'{args.url}/challenge/{id}/file?{'&'.join(f"{k}={v}" for k, v in file.items())}'
+
+        response = open_attachment(args, session, url_file_content, f'{category}/{name}')
+        if response is None:
+            continue
+        size = get_content_size(response)
+
+        origin_file_name = get_content_file_name(response, file.get('file', url_file_content.split('/')[-1]))
+
+        local_path, exist_flag = get_absolute_path(args, game_title, category, name, origin_file_name, args.manifest.is_tracked(url_file_content))
+        if local_path is None:
+            response.close()
+            continue
+
+        # download attachment
+        save_attachment(args, session, response, local_path, size, f'{category}/{name}', exist_flag, url_file_content, id)
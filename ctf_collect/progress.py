@@ -0,0 +1,146 @@
+import builtins
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+
+REFRESH_INTERVAL = 0.1      # seconds between redraws of the bars
+LOG_INTERVAL = 10           # seconds between lines when stdout is not a terminal
+SPEED_WINDOW = 5            # seconds of samples the throughput is averaged over
+MAX_BARS = 8
+
+# one lock for everything written to the terminal, so bars are erased before any other line
+output_lock = threading.RLock()
+
+_renderer = None
+
+
+def format_size(size: float):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024 or unit == 'GB':
+            break
+        size /= 1024
+    return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+
+
+def format_duration(seconds: float):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02}:{seconds:02}' if hours else f'{minutes}:{seconds:02}'
+
+
+class Transfer:
+    def __init__(self, renderer, title: str, size: int, got_size: int):
+        self.renderer = renderer
+        self.title = title
+        self.size = size
+        self.got_size = got_size
+
+    def update(self, length: int):
+        # called for every chunk, so it only counts; drawing happens on the renderer's own clock
+        self.got_size += length
+        self.renderer.transferred += length
+
+    def finish(self):
+        self.renderer.remove(self)
+
+
+class Renderer:
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.transfers = []
+        self.transferred = 0
+        self.samples = deque()
+        self.drawn_lines = 0
+        self.last_log = time.monotonic()
+        self.thread = None
+
+    def add(self, title: str, size: int, got_size: int):
+        transfer = Transfer(self, title, size, got_size)
+        with output_lock:
+            self.transfers.append(transfer)
+            if self.thread is None and self.mode != 'off':
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        return transfer
+
+    def remove(self, transfer: Transfer):
+        with output_lock:
+            self.transfers.remove(transfer)
+            if not self.transfers:
+                self.erase()
+
+    def speed(self):
+        now = time.monotonic()
+        self.samples.append((now, self.transferred))
+        while now - self.samples[0][0] > SPEED_WINDOW:
+            self.samples.popleft()
+        elapsed = now - self.samples[0][0]
+        return (self.transferred - self.samples[0][1]) / elapsed if elapsed > 0 else 0
+
+    def summary(self):
+        speed = self.speed()
+        remaining = sum(transfer.size - transfer.got_size for transfer in self.transfers if transfer.size != -1)
+        unknown = any(transfer.size == -1 for transfer in self.transfers)
+        eta = format_duration(remaining / speed) if speed > 0 and not unknown else '?'
+        return f'{len(self.transfers)} downloading, {format_size(speed)}/s, {format_size(remaining)}{"+" if unknown else ""} left, ETA {eta}'
+
+    def bar(self, transfer: Transfer, length: int):
+        if transfer.size > 0:
+            done = min(transfer.got_size * length // transfer.size, length)
+            return f'📥 {transfer.title.ljust(24)} {">" * done}{"_" * (length - done)} {format_size(transfer.got_size)}/{format_size(transfer.size)}'
+        return f'📥 {transfer.title.ljust(24)} [in progress] {format_size(transfer.got_size)}'
+
+    def erase(self):
+        # the cursor is left at the end of the last bar line
+        if self.drawn_lines:
+            builtins.print('\r' + f'\x1b[{self.drawn_lines - 1}A' * (self.drawn_lines > 1) + '\x1b[J', end='', flush=True)
+            self.drawn_lines = 0
+
+    def draw(self):
+        width = shutil.get_terminal_size().columns - 2     # a wrapped line would break the erasing
+        length = max(min(width - 50, 40), 10)
+        lines = [self.bar(transfer, length) for transfer in self.transfers[:MAX_BARS]]
+        if len(self.transfers) > MAX_BARS:
+            lines.append(f'   ... and {len(self.transfers) - MAX_BARS} more')
+        lines.append(f'⏬ {self.summary()}')
+        self.erase()
+        builtins.print('\n'.join(line[:width] for line in lines), end='', flush=True)
+        self.drawn_lines = len(lines)
+
+    def log(self):
+        now = time.monotonic()
+        if now - self.last_log >= LOG_INTERVAL:
+            builtins.print('⏬', self.summary(), flush=True)
+            self.last_log = now
+
+    def run(self):
+        while True:
+            time.sleep(REFRESH_INTERVAL)
+            with output_lock:
+                if not self.transfers:
+                    self.speed()
+                elif self.mode == 'bars':
+                    self.draw()
+                else:
+                    self.log()
+
+
+def start_transfer(args, title: str, size: int, got_size: int = 0):
+    global _renderer
+    with output_lock:
+        if _renderer is None:
+            mode = args.progress
+            if mode == 'auto':
+                mode = 'bars' if sys.stdout.isatty() else 'lines'
+            if mode == 'bars' and os.name == 'nt':
+                os.system('')       # enables ANSI escape sequences in the Windows console
+            _renderer = Renderer(mode)
+    return _renderer.add(title, size, got_size)
+
+
+def erase_progress():
+    if _renderer is not None:
+        _renderer.erase()
@@ -0,0 +1,152 @@
+import http.client
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import requests
+import urllib3
+from ctf_collect.jobs import print
+from ctf_collect.limit import create_rate_limiter
+from ctf_collect.metrics import ATTEMPT_BUCKETS
+from ctf_collect.trace import TracingAdapter
+
+# statuses of an overloaded or restarting platform, worth asking again
+RETRY_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRY_DELAY = 300
+
+# what a dropped or stalled connection raises, while the request or the body is being read
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, http.client.IncompleteRead, requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError, urllib3.exceptions.ProtocolError, urllib3.exceptions.TimeoutError)
+# subclasses of those that asking again does not fix, and that say nothing about the health of the host
+PERMANENT_ERRORS = (requests.exceptions.SSLError,)
+
+
+def get_retry_delay(args, attempt: int, response=None):
+    # exponential backoff with jitter, but never sooner than the platform asked for in Retry-After
+    delay = args.retry_backoff * 2 ** (attempt - 1)
+    delay = delay / 2 + random.uniform(0, delay / 2)
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            try:
+                delay = max(delay, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return min(delay, MAX_RETRY_DELAY)
+
+
+class CircuitBreaker:
+    # stops requests to a host that keeps failing, then lets a single request probe it after a cooldown
+
+    def __init__(self, host: str, threshold: int, cooldown: float):
+        self.host = host
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0
+        self.probing = False
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.failures >= self.threshold:
+                remaining = self.open_until - time.monotonic()
+                if remaining <= 0 and not self.probing:
+                    self.probing = True
+                    return
+                self.condition.wait(remaining if remaining > 0 else None)
+
+    def success(self):
+        with self.condition:
+            if self.failures >= self.threshold:
+                print('🔌', f'{self.host} is back, resuming requests')
+            self.failures = 0
+            self.probing = False
+            self.condition.notify_all()
+
+    def cancel(self):
+        # the request failed in a way that says nothing about the host
+        with self.condition:
+            self.probing = False
+            self.condition.notify_all()
+
+    def failure(self):
+        with self.condition:
+            self.failures += 1
+            if self.failures >= self.threshold and (self.failures == self.threshold or self.probing):
+                self.open_until = time.monotonic() + self.cooldown
+                print('🔌', f'{self.host} failed {self.failures} times in a row, pausing requests to it for {self.cooldown:g} seconds')
+            self.probing = False
+            self.condition.notify_all()
+
+
+class RetryAdapter(TracingAdapter):
+    # retries idempotent requests with backoff, through one circuit breaker per host
+
+    def __init__(self, args, **kwargs):
+        self.args = args
+        self.breakers = {}
+        self.rate_limiters = {}
+        self.hosts_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def get_breaker(self, host: str):
+        with self.hosts_lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(host, self.args.breaker_threshold, self.args.breaker_cooldown)
+            return self.breakers[host]
+
+    def get_rate_limiter(self, host: str):
+        with self.hosts_lock:
+            if host not in self.rate_limiters:
+                self.rate_limiters[host] = create_rate_limiter(self.args)
+            return self.rate_limiters[host]
+
+    def count_attempts(self, request, attempt: int):
+        self.args.metrics.observe('request_attempts', attempt, ATTEMPT_BUCKETS, method=request.method)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.args.timeout
+        host = urlsplit(request.url).netloc
+        breaker = self.get_breaker(host)
+        rate_limiter = self.get_rate_limiter(host)
+        retries = self.args.retries if request.method in ('GET', 'HEAD') else 0
+
+        for attempt in range(1, retries + 2):
+            breaker.acquire()
+            if rate_limiter is not None:
+                rate_limiter.take()
+            try:
+                response = super().send(request, **kwargs)
+            except PERMANENT_ERRORS:
+                breaker.cancel()
+                raise
+            except TRANSIENT_ERRORS as e:
+                breaker.failure()
+                if attempt > retries:
+                    self.count_attempts(request, attempt)
+                    raise
+                reason, response = type(e).__name__, None
+            except BaseException:
+                breaker.cancel()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUS:
+                    breaker.success()
+                    self.count_attempts(request, attempt)
+                    return response
+                breaker.failure()
+                if attempt > retries:
+                    self.count_attempts(request, attempt)
+                    return response
+                reason = f'status code {response.status_code}'
+                response.close()
+
+            delay = get_retry_delay(self.args, attempt, response)
+            # query strings may carry tokens
+            print('🔁', f'{request.method} {request.url.split("?")[0]} failed ({reason}), retry {attempt}/{retries} in {delay:.1f} seconds')
+            time.sleep(delay)
@@ -0,0 +1,17 @@
+def get_priority(args, entry: dict):
+    # higher category weight first, then known sizes from small to large, unknown sizes last
+    size = entry.get('size', -1)
+    return -args.category_weights.get(entry['category'].lower(), 0), size == -1, size
+
+
+def should_defer(args, size: int):
+    return args.deferred is not None and (size == -1 or size > args.small_size * 1024 * 1024)
+
+
+def defer_chall(args, category: str, chall_name: str, size: int, download):
+    # decided from the size in the challenge info before the attachment is requested at all;
+    # download() resolves and saves it when its turn comes, False if it is to be downloaded right away
+    if not should_defer(args, size):
+        return False
+    args.deferred.add(kind='challenge', category=category, chall=chall_name, size=size, download=download)
+    return True
@@ -0,0 +1,41 @@
+import requests
+from ctf_collect.cache import CachingAdapter, create_metadata_cache
+from ctf_collect.extract import create_extractor
+from ctf_collect.http2 import is_http2_available
+from ctf_collect.index import create_index
+from ctf_collect.jobs import print
+from ctf_collect.limit import create_bandwidth_limiter
+from ctf_collect.metrics import create_metrics
+from ctf_collect.mirror import create_mirror
+from ctf_collect.retry import RetryAdapter
+from ctf_collect.trace import create_tracer
+
+
+def create_session(args, headers: dict):
+    # one keep-alive session per run, so every request to the same host reuses the TCP/TLS connection
+    session = requests.Session()
+    session.headers.update(headers)
+
+    if args.http2 and not is_http2_available():
+        print('⚠️', 'HTTP/2 needs "pip install httpx[http2]", using HTTP/1.1')
+
+    # a blocking pool makes extra workers wait for a free connection instead of opening a new one
+    concurrent = args.jobs > 1 or args.metadata_concurrency > 1 or args.segments > 1
+    pool_options = dict(pool_connections=args.pool_connections, pool_maxsize=args.max_per_host, pool_block=concurrent)
+
+    # the bandwidth cap is shared by every transfer of the run, the request rate is limited per host by the adapter
+    args.bandwidth_limiter = create_bandwidth_limiter(args)
+    args.metadata_cache = create_metadata_cache(args)
+    args.metrics = create_metrics(args)
+    args.tracer = create_tracer(args)
+    args.extractor = create_extractor(args)
+    args.search_index = create_index(args)
+    args.team_mirror = create_mirror(args)
+    if args.metadata_cache is not None:
+        adapter = CachingAdapter(args, args.metadata_cache, **pool_options)
+    else:
+        adapter = RetryAdapter(args, **pool_options)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
@@ -0,0 +1,58 @@
+import os
+import shutil
+import stat
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+
+FICLONE = 0x40049409
+
+
+def get_blob_path(args, sha256: str):
+    return os.path.join(args.store, sha256[:2], sha256)
+
+
+def has_blob(args, sha256: str):
+    return args.store is not None and sha256 is not None and os.path.exists(get_blob_path(args, sha256))
+
+
+def add_blob(args, part_path: str, sha256: str):
+    # move a finished download into the store, or drop it if the same bytes are already there
+    blob_path = get_blob_path(args, sha256)
+    if os.path.exists(blob_path):
+        os.remove(part_path)
+    else:
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.replace(part_path, blob_path)
+        # hardlinked copies share the blob, so editing one of them in place must not be easy
+        os.chmod(blob_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    return blob_path
+
+
+def reflink(src_path: str, dst_path: str):
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return
+            except OSError:
+                pass
+        shutil.copyfileobj(src, dst)
+
+
+def link_blob(args, blob_path: str, local_path: str):
+    if os.path.exists(local_path) and os.path.samefile(blob_path, local_path):
+        return      # already a hard link of this blob, and rename() would leave tmp_path behind
+    tmp_path = f'{local_path}.link'
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    if args.store_mode == 'hardlink':
+        try:
+            os.link(blob_path, tmp_path)
+        except OSError:
+            # another file system, or one without hard links
+            reflink(blob_path, tmp_path)
+    else:
+        reflink(blob_path, tmp_path)
+    os.replace(tmp_path, local_path)
@@ -0,0 +1,289 @@
+import atexit
+import json
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+try:
+    from urllib3.exceptions import NameResolutionError
+except ImportError:     # urllib3 1.26 raises NewConnectionError for a name that does not resolve
+    NameResolutionError = None
+from urllib3.util.connection import allowed_gai_family
+from ctf_collect.http2 import HTTP2Adapter
+from ctf_collect.jobs import print
+
+# waiting for a pooled connection shorter than this is not worth an event
+MIN_QUEUE_TIME = 0.001
+
+_current = threading.local()
+
+
+def get_current_trace():
+    return getattr(_current, 'trace', None)
+
+
+class RequestTrace:
+    # the phases of one HTTP request, from asking the pool for a connection until the body is read or dropped
+
+    def __init__(self, tracer, request, stream: bool):
+        self.tracer = tracer
+        self.method = request.method
+        self.url = request.url
+        self.kind = 'attachment' if stream else 'metadata'
+        self.chall = tracer.labels.get(request.url)
+        self.thread = threading.current_thread()
+        self.started = time.perf_counter()
+        self.last = self.started      # where the next phase starts
+        self.connected = None
+        self.phases = []
+        self.status = None
+        self.content_length = None
+        self.error = None
+        self.finished = False
+
+    def add(self, name: str, started: float, ended: float):
+        self.phases.append((name, started, ended))
+        self.last = ended
+
+    def start_response(self, response):
+        now = time.perf_counter()
+        self.add('ttfb', self.last, now)
+        self.status = response.status_code
+        if response.headers.get('Content-Length', '').isdigit():
+            self.content_length = int(response.headers['Content-Length'])
+
+        # the body is read after send() returns, by requests or by the writer;
+        # either way urllib3 releases or closes the connection when it is done with it
+        raw = response.raw
+        release_conn, close = raw.release_conn, raw.close
+
+        def finished_release_conn():
+            self.finish()
+            release_conn()
+
+        def finished_close():
+            self.finish()
+            close()
+
+        raw.release_conn = finished_release_conn
+        raw.close = finished_close
+
+    def finish(self, error: str = None):
+        if self.finished:
+            return
+        self.finished = True
+        self.error = error
+        if self.status is not None:
+            self.add('transfer', self.last, time.perf_counter())
+        self.tracer.record(self)
+
+
+class Tracer:
+
+    # timings go to the run metrics, and to the trace and the event log if they were asked for;
+    # only those two get queue, DNS, connect and TLS apart, otherwise they count as time to first byte
+
+    def __init__(self, platform: str, trace_path: str, event_log_path: str, metrics=None):
+        self.trace_path = trace_path
+        self.detailed = trace_path is not None or event_log_path is not None
+        self.metrics = metrics
+        self.platform = platform
+        self.started = time.perf_counter()
+        self.epoch = time.time() - self.started
+        self.labels = {}
+        self.events = []
+        self.threads = {}
+        self.pending = set()
+        self.saved = False
+        self.lock = threading.Lock()
+        self.event_log = open(event_log_path, 'w', encoding='utf-8') if event_log_path else None
+
+    def label(self, url: str, chall: str):
+        # requests to url belong to the challenge chall, including retries, resumes and segments
+        self.labels[url] = chall
+
+    def start(self, request, stream: bool):
+        trace = RequestTrace(self, request, stream)
+        with self.lock:
+            self.pending.add(trace)
+        return trace
+
+    def get_tid(self, thread):
+        if thread.ident not in self.threads:
+            self.threads[thread.ident] = len(self.threads) + 1
+            self.events.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': self.threads[thread.ident], 'args': {'name': thread.name}})
+        return self.threads[thread.ident]
+
+    def record(self, trace: RequestTrace):
+        if self.metrics is not None:
+            self.metrics.observe_request(trace)
+        if self.trace_path is None and self.event_log is None:
+            with self.lock:
+                self.pending.discard(trace)
+            return
+        url = trace.url.split('?')[0]       # query strings may carry tokens
+        ended = trace.phases[-1][2] if trace.phases else time.perf_counter()
+        info = {
+            'platform': self.platform,
+            'kind': trace.kind,
+            'chall': trace.chall,
+            'method': trace.method,
+            'url': url,
+            'host': urlsplit(url).netloc,
+            'status': trace.status,
+            'error': trace.error,
+            'reused': not any(name == 'connect' for name, _, _ in trace.phases),
+            'content_length': trace.content_length,
+        }
+        with self.lock:
+            self.pending.discard(trace)
+            if self.saved:
+                return      # a response dropped at interpreter exit
+            if self.event_log is not None:
+                phases = {}
+                for name, started, phase_ended in trace.phases:
+                    phases[name] = round(phases.get(name, 0) + phase_ended - started, 6)
+                self.event_log.write(json.dumps(dict(info, start=round(self.epoch + trace.started, 6), duration=round(ended - trace.started, 6), phases=phases), ensure_ascii=False) + '\n')
+                self.event_log.flush()
+            if self.trace_path is not None:
+                tid = self.get_tid(trace.thread)
+                name = f'{trace.method} {urlsplit(url).path}'
+                if trace.chall:
+                    name = f'{trace.chall} {name}'
+                self.events.append({'name': name, 'cat': trace.kind, 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+                                    'ts': self.get_ts(trace.started), 'dur': self.get_ts(ended) - self.get_ts(trace.started), 'args': info})
+                for phase, started, phase_ended in trace.phases:
+                    self.events.append({'name': phase, 'cat': trace.kind, 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+                                        'ts': self.get_ts(started), 'dur': self.get_ts(phase_ended) - self.get_ts(started)})
+
+    def get_ts(self, moment: float):
+        # microseconds since the tracer started
+        return round((moment - self.started) * 1e6, 1)
+
+    def save(self):
+        # responses that were never read to the end nor closed, e.g. because the run was interrupted
+        for trace in list(self.pending):
+            trace.finish('unfinished')
+        with self.lock:
+            self.saved = True
+            if self.event_log is not None:
+                self.event_log.close()
+                print('🧵', f'Event log written to {self.event_log.name}')
+            if self.trace_path is not None:
+                with open(self.trace_path, 'w', encoding='utf-8') as f:
+                    json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+                print('🧵', f'Trace written to {self.trace_path}, open it in chrome://tracing or ui.perfetto.dev')
+
+
+class TracedConnectionMixin:
+
+    def _new_conn(self):
+        trace = get_current_trace()
+        if trace is None:
+            return super()._new_conn()
+        started = time.perf_counter()
+        try:
+            addresses = [info[4][0] for info in socket.getaddrinfo(self._dns_host, self.port, allowed_gai_family(), socket.SOCK_STREAM)]
+        except socket.gaierror as e:
+            if NameResolutionError is None:
+                raise NewConnectionError(self, f'Failed to resolve {self.host} ({e})') from e
+            raise NameResolutionError(self.host, self, e) from e
+        resolved = time.perf_counter()
+        trace.add('dns', started, resolved)
+
+        # connect to the resolved addresses in turn, as urllib3 would, without resolving the name again
+        dns_host = self._dns_host
+        try:
+            for address in addresses:
+                self._dns_host = address
+                try:
+                    sock = super()._new_conn()
+                    break
+                except (NewConnectionError, ConnectTimeoutError):
+                    if address == addresses[-1]:
+                        raise
+        finally:
+            self._dns_host = dns_host
+        trace.connected = time.perf_counter()
+        trace.add('connect', resolved, trace.connected)
+        return sock
+
+
+class TracedHTTPConnection(TracedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TracedHTTPSConnection(TracedConnectionMixin, HTTPSConnection):
+
+    def connect(self):
+        super().connect()
+        trace = get_current_trace()
+        if trace is not None and trace.connected is not None:
+            trace.add('tls', trace.connected, time.perf_counter())
+
+
+class TracedPoolMixin:
+
+    def _get_conn(self, timeout=None):
+        trace = get_current_trace()
+        started = time.perf_counter()
+        conn = super()._get_conn(timeout)
+        if trace is not None and time.perf_counter() - started >= MIN_QUEUE_TIME:
+            trace.add('queue', started, time.perf_counter())
+        return conn
+
+
+class TracedHTTPConnectionPool(TracedPoolMixin, HTTPConnectionPool):
+    ConnectionCls = TracedHTTPConnection
+
+
+class TracedHTTPSConnectionPool(TracedPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = TracedHTTPSConnection
+
+
+class TracingAdapter(HTTP2Adapter):
+    # times every request sent on the wire; subclasses set self.args before __init__
+
+    def get_trace(self):
+        trace = get_current_trace()
+        return trace if trace is not None and trace.tracer.detailed else None
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        # the traced pools set up connections themselves, which is left to urllib3 unless a trace was asked for
+        if self.args.tracer is not None and self.args.tracer.detailed:
+            self.poolmanager.pool_classes_by_scheme = {'http': TracedHTTPConnectionPool, 'https': TracedHTTPSConnectionPool}
+
+    def send(self, request, stream=False, **kwargs):
+        tracer = self.args.tracer
+        if tracer is None:
+            return super().send(request, stream=stream, **kwargs)
+
+        trace = tracer.start(request, stream)
+        _current.trace = trace
+        try:
+            response = super().send(request, stream=stream, **kwargs)
+        except BaseException as e:
+            trace.finish(type(e).__name__)
+            raise
+        finally:
+            _current.trace = None
+        trace.start_response(response)
+        return response
+
+
+def label_request(args, url: str, chall: str):
+    if args.tracer is not None:
+        args.tracer.label(url, chall)
+
+
+def create_tracer(args):
+    tracer = Tracer(args.platform, args.trace, args.event_log, args.metrics)
+    if tracer.detailed:
+        # written however the run ends, so the trace of an interrupted or failing run is there too
+        atexit.register(tracer.save)
+    return tracer
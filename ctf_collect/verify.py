@@ -0,0 +1,85 @@
+import hashlib
+import mmap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from ctf_collect.manifest import MANIFEST_FILE_NAME, Manifest
+
+HASH_BLOCK_SIZE = 64 * 1024 * 1024
+
+
+def hash_file(path: str):
+    # runs in a worker process, so large files are hashed in parallel on every core
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                for offset in range(0, size, HASH_BLOCK_SIZE):
+                    sha256.update(view[offset:offset + HASH_BLOCK_SIZE])
+                view.release()
+    return size, sha256.hexdigest()
+
+
+def check_entry(path: str, entry: dict):
+    if not os.path.exists(path):
+        return 'missing'
+    try:
+        size, sha256 = hash_file(path)
+    except OSError as e:
+        return f'unreadable ({e})'
+    if entry.get('size') is not None and size != entry['size']:
+        return f'size mismatch ({format(size, ",")} bytes, expected {format(entry["size"], ",")})'
+    if entry.get('sha256') is not None and sha256 != entry['sha256']:
+        return 'hash mismatch'
+    return None
+
+
+def verify_manifest(args, manifest: Manifest):
+    entries = sorted(manifest.attachments.items(), key=lambda item: -(item[1].get('size') or 0))
+    print('🔍', f'verifying {len(entries)} files with {args.verify_workers} processes...')
+
+    bad = []
+    with ProcessPoolExecutor(max_workers=args.verify_workers) as executor:
+        paths = [manifest.get_local_path(entry) for _, entry in entries]
+        for (key, entry), path, problem in zip(entries, paths, executor.map(check_entry, paths, [entry for _, entry in entries])):
+            if problem is None:
+                continue
+            print('❌', path, problem)
+            bad.append((key, path))
+
+    # a bad file would otherwise be skipped as existing or answered 304 on the next run
+    if args.quarantine and bad:
+        for key, path in bad:
+            if os.path.exists(path):
+                os.replace(path, f'{path}.bad')
+            del manifest.attachments[key]
+        manifest.save()
+
+    root_directory = os.path.dirname(manifest.path) or '.'
+    partial = [os.path.join(dir_path, file_name) for dir_path, _, file_names in os.walk(root_directory)
+                                                 for file_name in file_names if file_name.endswith('.part')]
+    for path in partial:
+        print('⏯', path, 'is an unfinished download')
+
+    if bad and args.quarantine:
+        print('🔁', f'{len(bad)} of {len(entries)} files need a re-fetch, they were moved aside to *.bad and will be downloaded again on the next run')
+    elif bad:
+        print('🔁', f'{len(bad)} of {len(entries)} files need a re-fetch, verify again with "--quarantine" to move them aside so the next run downloads them again')
+    else:
+        print('🎉', f'All {len(entries)} files are intact.')
+    return bad
+
+
+def verify(args):
+    bad = False
+    for root_directory in args.root_directory:
+        manifest_path = os.path.join(root_directory, MANIFEST_FILE_NAME)
+        if not os.path.isfile(manifest_path):
+            print('❌', f'No {MANIFEST_FILE_NAME} in {root_directory}')
+            bad = True
+            continue
+        bad = bool(verify_manifest(args, Manifest(manifest_path))) or bad
+    if bad:
+        sys.exit(1)
@@ -0,0 +1,64 @@
+import json
+import os
+import subprocess
+import time
+from ctf_collect.jobs import print
+from ctf_collect.metrics import write_metrics
+
+# list fields that change while a game runs without the challenge itself changing
+VOLATILE_KEYS = {'score', 'solved', 'solves', 'solved_count', 'solvedCount', 'solve_count', 'bloods', 'points', 'is_solved', 'isSolved'}
+
+
+def fingerprint(object):
+    return json.dumps({k: v for k, v in object.items() if k not in VOLATILE_KEYS}, sort_keys=True, ensure_ascii=False)
+
+
+def notify(args, game_title: str, category: str, chall_name: str, event: str):
+    # event is "released" for a challenge not listed before, "updated" for one whose entry changed
+    print('🔔' if event == 'released' else '🔄', f'{category}/{chall_name}'.ljust(24), 'is released' if event == 'released' else 'was updated')
+    if args.notify:
+        # names come from the platform, so they are passed by environment instead of formatted into the command
+        env = dict(os.environ, CTF_GAME=game_title, CTF_CATEGORY=category, CTF_CHALL=chall_name, CTF_EVENT=event)
+        subprocess.run(args.notify, shell=True, env=env)
+
+
+def watch_challs(args, game_title: str, list_challs, download_challs, describe):
+    # list_challs() returns the current challenge list or None, download_challs(objects) fetches them and returns
+    # the ids of those that failed, and describe(object) gives (id, category, name) of a list entry
+    seen = {}           # id -> fingerprint of the list entry last downloaded without a failure
+    announced = {}      # id -> fingerprint of the list entry last notified about
+    first_round = True
+    try:
+        while True:
+            if args.metadata_cache is not None:
+                args.metadata_cache.start_round()
+            if args.team_mirror is not None:
+                args.team_mirror.start_round()
+            try:
+                objects = list_challs()
+            except Exception as e:
+                print('❌', f'Failed to poll challenge list, error: {e}')
+                objects = None
+            if objects is not None:
+                fresh = [object for object in objects if seen.get(describe(object)[0]) != fingerprint(object)]
+                for object in fresh:
+                    id, category, name = describe(object)
+                    # a challenge that failed is tried again every round, but only announced once
+                    if not first_round and announced.get(id) != fingerprint(object):
+                        notify(args, game_title, category, name, 'updated' if id in announced else 'released')
+                    announced[id] = fingerprint(object)
+                failed = set()
+                if fresh:
+                    failed = download_challs(fresh)
+                    # a mirror serving this directory reads the manifest between rounds
+                    args.manifest.flush()
+                for object in fresh:
+                    if describe(object)[0] not in failed:
+                        seen[describe(object)[0]] = fingerprint(object)
+                if failed:
+                    print('🔁', f'{len(failed)} challenges failed, trying them again in the next round')
+                first_round = False
+            write_metrics(args, game_title)
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        print('\n👋', 'Stopped watching.')
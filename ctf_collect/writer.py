@@ -0,0 +1,65 @@
+import os
+import time
+
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+START_CHUNK_SIZE = 64 * 1024
+CHECKPOINT_INTERVAL = 8 * 1024 * 1024
+
+# a read that returns a whole chunk faster than this asks for a bigger one, a slower one for a smaller one
+FAST_READ = 0.01
+SLOW_READ = 0.25
+
+
+def preallocate(fp, size: int):
+    # reserve the whole file at once instead of growing it chunk by chunk
+    if size <= 0 or not hasattr(os, 'posix_fallocate'):
+        return False
+    try:
+        fp.flush()
+        os.posix_fallocate(fp.fileno(), 0, size)
+    except OSError:
+        return False    # not supported by the filesystem
+    return True
+
+
+def write_body(response, fp, transfer, sha256=None, limit: int = None, checkpoint=None, bandwidth_limiter=None):
+    # copy the body of a streamed response into fp at its current position, at most limit bytes;
+    # checkpoint(written) is called after a flush every few MB, returns the number of bytes written
+    # urllib3 1.26 takes a connection closed before Content-Length for the end of the body unless told otherwise
+    response.raw.enforce_content_length = True
+    max_chunk_size = MAX_CHUNK_SIZE
+    if bandwidth_limiter is not None:
+        # reads larger than the limiter's burst would come in stalls
+        max_chunk_size = min(max_chunk_size, max(int(bandwidth_limiter.capacity), MIN_CHUNK_SIZE))
+    chunk_size = min(START_CHUNK_SIZE, max_chunk_size)
+    written = 0
+    unsaved = 0
+    while limit is None or written < limit:
+        want = chunk_size if limit is None else min(chunk_size, limit - written)
+        started = time.perf_counter()
+        chunk = response.raw.read(want, decode_content=True)
+        length = len(chunk)
+        if not length:
+            break
+        elapsed = time.perf_counter() - started
+        if bandwidth_limiter is not None:
+            bandwidth_limiter.take(length)
+
+        fp.write(chunk)
+        if sha256 is not None:
+            sha256.update(chunk)
+        written += length
+        unsaved += length
+        transfer.update(length)
+
+        if length == chunk_size and elapsed < FAST_READ:
+            chunk_size = min(chunk_size * 2, max_chunk_size)
+        elif elapsed > SLOW_READ:
+            chunk_size = max(chunk_size // 2, MIN_CHUNK_SIZE)
+
+        if checkpoint is not None and unsaved >= CHECKPOINT_INTERVAL:
+            fp.flush()
+            checkpoint(written)
+            unsaved = 0
+    return written
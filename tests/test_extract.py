@@ -0,0 +1,94 @@
+import io
+import os
+import tarfile
+import zipfile
+import pytest
+from ctf_collect.extract import Budget, ExtractLimitError, copy_limited, extract_archive, get_safe_target
+
+
+def make_zip(path, members: dict):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return str(path)
+
+
+def test_safe_target_rejects_absolute_and_climbing_names(tmp_path):
+    for name in ('/etc/passwd', '../outside', 'a/../../outside', 'C:/windows', 'C:\\windows', '..\\outside', ''):
+        assert get_safe_target(str(tmp_path), name) is None
+    assert get_safe_target(str(tmp_path), './a//b\\c') == os.path.join(str(tmp_path), 'a', 'b', 'c')
+
+
+def test_extract_unpacks_next_to_the_archive_and_skips_unsafe_members(tmp_path):
+    path = make_zip(tmp_path / 'attachment.zip', {'chall/flag.txt': 'flag', '../evil.txt': 'evil'})
+    result = extract_archive(path, 1 << 20, 100, 1)
+    assert result['destination'] == str(tmp_path / 'attachment')
+    assert result['files'] == 1 and result['skipped'] == 1 and result['error'] is None
+    assert (tmp_path / 'attachment' / 'chall' / 'flag.txt').read_text() == 'flag'
+    assert not (tmp_path / 'evil.txt').exists()
+    assert (tmp_path / 'attachment.contents.txt').exists()
+
+
+def test_extract_stops_at_the_file_limit(tmp_path):
+    path = make_zip(tmp_path / 'many.zip', {f'{i}.txt': 'x' for i in range(10)})
+    result = extract_archive(path, 1 << 20, 3, 1)
+    assert result['error'].startswith('too many files')
+    assert len(os.listdir(tmp_path / 'many')) == 3
+
+
+def test_extract_stops_at_the_size_limit_without_a_truncated_member(tmp_path):
+    path = make_zip(tmp_path / 'bomb.zip', {'small.txt': 'x' * 100, 'zeros.bin': b'\0' * (4 << 20)})
+    result = extract_archive(path, 1 << 20, 100, 1)
+    assert result['error'].startswith('too large')
+    assert os.listdir(tmp_path / 'bomb') == ['small.txt']
+
+
+def test_copy_limited_counts_the_bytes_written_not_the_declared_size(tmp_path):
+    target = tmp_path / 'member'
+    with pytest.raises(ExtractLimitError):
+        copy_limited(io.BytesIO(b'x' * (3 << 20)), str(target), Budget(1 << 20, 10))
+    assert not target.exists()
+
+
+def test_extract_leaves_links_in_tarballs_out(tmp_path):
+    path = tmp_path / 'links.tar.gz'
+    with tarfile.open(path, 'w:gz') as archive:
+        link = tarfile.TarInfo('passwd')
+        link.type = tarfile.SYMTYPE
+        link.linkname = '/etc/passwd'
+        archive.addfile(link)
+        data = tarfile.TarInfo('flag.txt')
+        data.size = 4
+        archive.addfile(data, io.BytesIO(b'flag'))
+    result = extract_archive(str(path), 1 << 20, 100, 1)
+    assert result['files'] == 1 and result['skipped'] == 1
+    assert sorted(os.listdir(tmp_path / 'links')) == ['flag.txt']
+
+
+def test_extract_unpacks_nested_archives_only_to_the_depth(tmp_path):
+    inner = io.BytesIO()
+    with zipfile.ZipFile(inner, 'w') as archive:
+        archive.writestr('deep.txt', 'deep')
+    path = make_zip(tmp_path / 'outer.zip', {'inner.zip': inner.getvalue()})
+    assert extract_archive(path, 1 << 20, 100, 0)['nested'] == 1
+    assert not (tmp_path / 'outer' / 'inner').exists()
+
+
+def test_extract_skips_an_unchanged_archive_and_keeps_the_earlier_unpack(tmp_path):
+    path = make_zip(tmp_path / 'attachment.zip', {'flag.txt': 'one'})
+    extract_archive(path, 1 << 20, 100, 1)
+    (tmp_path / 'attachment' / 'solve.py').write_text('# mine')
+    assert extract_archive(path, 1 << 20, 100, 1) == {'destination': str(tmp_path / 'attachment'), 'unchanged': True}
+
+    make_zip(tmp_path / 'attachment.zip', {'flag.txt': 'two'})
+    result = extract_archive(path, 1 << 20, 100, 1)
+    assert result['moved'] == str(tmp_path / 'attachment.old-1')
+    assert (tmp_path / 'attachment' / 'flag.txt').read_text() == 'two'
+    assert (tmp_path / 'attachment.old-1' / 'solve.py').read_text() == '# mine'
+
+
+def test_extract_does_not_touch_a_directory_it_did_not_unpack(tmp_path):
+    path = make_zip(tmp_path / 'attachment.zip', {'flag.txt': 'flag'})
+    (tmp_path / 'attachment').mkdir()
+    assert 'error' in extract_archive(path, 1 << 20, 100, 1)
+    assert os.listdir(tmp_path / 'attachment') == []
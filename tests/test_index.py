@@ -0,0 +1,39 @@
+import pytest
+from ctf_collect.index import Index, get_match_query
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = Index(str(tmp_path / 'index.sqlite'), 'gzctf')
+    index.game = 'LRCTF 2024'
+    index.add_description('crypto', 'baby rsa', str(tmp_path / 'crypto' / 'baby rsa' / 'description.txt'), 'textbook RSA with "small" e, padding oracle')
+    index.add_description('misc', '签到题', str(tmp_path / 'misc' / '签到题' / 'description.txt'), '欢迎来到 LRCTF')
+    index.add_file('pwn', 'heap', str(tmp_path / 'pwn' / 'heap' / 'tcache.zip'), 1024, 'ab' * 32, 'https://example.com/tcache.zip?token=x')
+    yield index
+    index.close()
+
+
+def test_match_query_quotes_every_word():
+    assert get_match_query('rsa padding') == '"rsa" "padding"'
+    assert get_match_query('pad*') == '"pad"*'
+    assert get_match_query('say "hi"') == '"say" """hi"""'
+    assert get_match_query('签到') == '"签 到"'
+
+
+def test_match_query_takes_fts5_syntax_literally():
+    for query in ('OR', 'a OR b', 'NOT x', 'NEAR(a b)', 'col:value', '-x', '^start', '(', '"', '*', 'a + b', '{game}'):
+        for phrase in get_match_query(query).split(' '):
+            assert phrase.startswith('"') and phrase.rstrip('*').endswith('"')
+
+
+@pytest.mark.parametrize('query', ['OR', 'a OR b', 'NOT x', 'NEAR(a b)', 'crypto:rsa', '-x', '^start', '(', '"', '*', '"unbalanced', "it's"])
+def test_search_does_not_fail_on_fts5_syntax(index, query):
+    assert isinstance(index.search(query), list)
+
+
+def test_search_finds_words_prefixes_and_cjk(index):
+    assert [hit['chall'] for hit in index.search('rsa padding')] == ['baby rsa']
+    assert [hit['chall'] for hit in index.search('"small"')] == ['baby rsa']
+    assert [hit['chall'] for hit in index.search('tcach*')] == ['heap']
+    assert [hit['chall'] for hit in index.search('签到')] == ['签到题']
+    assert index.search('rsa', category='misc') == []
@@ -0,0 +1,73 @@
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import pytest
+from ctf_collect.manifest import MANIFEST_FILE_NAME, Manifest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+from mock_platforms import RACE_ID, add_mock_arguments, create_server   # noqa: E402
+
+URLS = {
+    'gzctf': '/games/1',
+    'cyberpeace': f'/page/mg/ct/contest/flag/{RACE_ID}/ContestPage',
+    'ret2shell': '/games/1',
+    'nu1l': '',
+}
+
+
+def make_manifest(tmp_path, **validators):
+    path = tmp_path / 'attachment.zip'
+    path.write_bytes(b'attachment')
+    manifest = Manifest(str(tmp_path / MANIFEST_FILE_NAME))
+    manifest.record('https://example.com/attachment.zip', path=str(path), size=10, **validators)
+    return manifest
+
+
+def test_entry_without_validators_is_not_revalidated(tmp_path):
+    manifest = make_manifest(tmp_path, etag=None, last_modified=None)
+    assert not manifest.is_tracked('https://example.com/attachment.zip')
+    assert manifest.get_conditional_headers('https://example.com/attachment.zip') == {}
+
+
+def test_entry_with_validators_is_revalidated(tmp_path):
+    manifest = make_manifest(tmp_path, etag='"abc"', last_modified='Mon, 01 Jan 2024 00:00:00 GMT')
+    assert manifest.is_tracked('https://example.com/attachment.zip')
+    assert manifest.get_conditional_headers('https://example.com/attachment.zip') == {
+        'If-None-Match': '"abc"', 'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+    os.remove(tmp_path / 'attachment.zip')
+    assert not manifest.is_tracked('https://example.com/attachment.zip')
+
+
+def test_records_are_batched_until_flush(tmp_path):
+    manifest = make_manifest(tmp_path, etag='"abc"')
+    assert not os.path.exists(manifest.path)
+    manifest.flush()
+    assert list(Manifest(manifest.path).attachments) == ['https://example.com/attachment.zip']
+    assert Manifest(manifest.path).attachments['https://example.com/attachment.zip']['path'] == 'attachment.zip'
+
+
+@pytest.fixture
+def platform_without_validators():
+    parser = argparse.ArgumentParser()
+    add_mock_arguments(parser)
+    server = create_server(parser.parse_args(['--challenges', '4', '--latency', '0', '--file-size', '4K', '--no-validators']))
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('platform', list(URLS))
+def test_second_run_skips_files_the_platform_sent_no_validators_for(tmp_path, platform_without_validators, platform):
+    command = [sys.executable, '-m', 'ctf_collect', platform, '-u', platform_without_validators + URLS[platform], '-t', 'x',
+               '--no-index', '--no-cache', '--progress', 'off']
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    first = subprocess.run(command, cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60)
+    assert first.returncode == 0, first.stdout + first.stderr
+    second = subprocess.run(command, cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60)
+    assert second.returncode == 0, second.stdout + second.stderr
+    assert second.stdout.count('already exists') == 4
+    assert '[overwritten]' not in second.stdout
@@ -0,0 +1,30 @@
+import pytest
+from ctf_collect.metrics import ATTEMPT_BUCKETS, LATENCY_BUCKETS, Metrics
+
+
+def test_histogram_keeps_counts_not_observations():
+    metrics = Metrics('gzctf')
+    for _ in range(10000):
+        metrics.observe('request_duration_seconds', 0.05, LATENCY_BUCKETS, kind='attachment')
+    histogram = metrics.get_histogram('request_duration_seconds')
+    assert not hasattr(histogram, 'values')
+    assert histogram.count == 10000 and histogram.sum == pytest.approx(500)
+
+
+@pytest.mark.parametrize('quantile, expected', [(0.5, 0.025 + 0.025 * 500 / 900), (0.9, 0.05), (0.95, 0.375), (1.0, 0.5)])
+def test_histogram_quantile_is_interpolated_within_its_bucket(quantile, expected):
+    metrics = Metrics('gzctf')
+    for i in range(1000):
+        metrics.observe('request_duration_seconds', 0.05 if i < 900 else 0.3, LATENCY_BUCKETS, kind='metadata' if i % 2 else 'attachment')
+    assert metrics.get_histogram('request_duration_seconds').get_quantile(quantile) == pytest.approx(expected)
+
+
+def test_histogram_is_exported_in_the_prometheus_format():
+    metrics = Metrics('gzctf')
+    for attempts in (1, 1, 2, 5):
+        metrics.observe('request_attempts', attempts, ATTEMPT_BUCKETS, method='GET')
+    text = metrics.format()
+    assert 'ctf_collect_request_attempts_bucket{platform="gzctf",game="",method="GET",le="1"} 2' in text
+    assert 'ctf_collect_request_attempts_bucket{platform="gzctf",game="",method="GET",le="+Inf"} 4' in text
+    assert 'ctf_collect_request_attempts_sum{platform="gzctf",game="",method="GET"} 9' in text
+    assert metrics.get_histogram('missing') is None
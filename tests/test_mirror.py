@@ -0,0 +1,72 @@
+import http.client
+import os
+import threading
+from urllib.parse import quote
+import pytest
+from ctf_collect.manifest import MANIFEST_FILE_NAME, Manifest
+from ctf_collect.mirror import MirrorServer
+
+
+def write(path, content: bytes = b'data'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    game = tmp_path / 'Game'
+    write(game / 'misc' / 'chall' / 'attachment.zip', b'attachment')
+    write(game / 'misc' / 'chall' / 'description.txt', b'description')
+    write(game / 'misc' / 'chall' / 'notes.txt', b'untracked')
+    write(game / 'misc' / 'chall' / 'big.zip.part', b'unfinished')
+    write(tmp_path / 'secrets' / 'notes.txt', b'secret')
+    write(tmp_path / 'secrets' / 'description.txt', b'secret')
+    write(tmp_path / 'Other' / 'README.md', b'no manifest')
+    manifest = Manifest(str(game / MANIFEST_FILE_NAME))
+    manifest.record('https://platform/attachment.zip', path=str(game / 'misc' / 'chall' / 'attachment.zip'), size=10, etag='"abc"')
+    manifest.save()
+
+    server = MirrorServer(('127.0.0.1', 0), str(tmp_path))
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+
+    def get(path: str):
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+        connection.request('GET', path)
+        response = connection.getresponse()
+        body = response.read()
+        connection.close()
+        return response.status, response.getheader('ETag'), body
+
+    yield get
+    server.shutdown()
+    server.server_close()
+
+
+def test_mirror_serves_the_manifest_tracked_attachments_and_descriptions(mirror):
+    assert mirror('/')[0] == 200
+    assert mirror(f'/Game/{MANIFEST_FILE_NAME}')[0] == 200
+    assert mirror('/Game/misc/chall/attachment.zip') == (200, '"abc"', b'attachment')
+    assert mirror('/Game/misc/chall/description.txt')[2] == b'description'
+
+
+@pytest.mark.parametrize('path', [
+    '/Game/misc/chall/notes.txt',
+    '/Game/misc/chall/big.zip.part',
+    '/secrets/notes.txt',
+    '/secrets/description.txt',
+    '/Other/README.md',
+    '/Game/../secrets/notes.txt',
+    '/Game/misc/../../secrets/description.txt',
+    '/Game/' + quote('../secrets/description.txt', safe=''),
+    '/Game/' + quote('..\\secrets\\description.txt', safe=''),
+    '/' + quote('/etc/passwd', safe=''),
+])
+def test_mirror_rejects_untracked_and_climbing_paths(mirror, path):
+    assert mirror(path)[0] == 404
+
+
+def test_mirror_does_not_follow_links_out_of_the_game(mirror, tmp_path):
+    os.symlink(tmp_path / 'secrets', tmp_path / 'Game' / 'misc' / 'link')
+    assert mirror('/Game/misc/link/description.txt')[0] == 404
@@ -0,0 +1,100 @@
+import argparse
+import threading
+import time
+from email.utils import formatdate
+import requests
+from ctf_collect.retry import MAX_RETRY_DELAY, CircuitBreaker, get_retry_delay
+
+
+def make_response(retry_after: str = None):
+    response = requests.Response()
+    if retry_after is not None:
+        response.headers['Retry-After'] = retry_after
+    return response
+
+
+def test_retry_delay_backs_off_with_jitter():
+    args = argparse.Namespace(retry_backoff=1.0)
+    for attempt in range(1, 5):
+        delay = get_retry_delay(args, attempt)
+        assert 2 ** (attempt - 1) / 2 <= delay <= 2 ** (attempt - 1)
+
+
+def test_retry_delay_waits_for_retry_after_seconds():
+    args = argparse.Namespace(retry_backoff=0.1)
+    assert get_retry_delay(args, 1, make_response('7')) == 7
+    # a shorter Retry-After does not cut the backoff short
+    assert get_retry_delay(argparse.Namespace(retry_backoff=100.0), 1, make_response('1')) >= 50
+
+
+def test_retry_delay_waits_for_retry_after_date():
+    args = argparse.Namespace(retry_backoff=0.1)
+    delay = get_retry_delay(args, 1, make_response(formatdate(time.time() + 30, usegmt=True)))
+    assert 28 <= delay <= 30
+
+
+def test_retry_delay_ignores_a_broken_retry_after_and_is_capped():
+    args = argparse.Namespace(retry_backoff=0.1)
+    assert get_retry_delay(args, 1, make_response('soon')) <= 0.1
+    assert get_retry_delay(args, 1, make_response('86400')) == MAX_RETRY_DELAY
+    assert get_retry_delay(argparse.Namespace(retry_backoff=1.0), 30) == MAX_RETRY_DELAY
+
+
+def open_breaker(cooldown: float):
+    breaker = CircuitBreaker('example.com', 2, cooldown)
+    for _ in range(2):
+        breaker.acquire()
+        breaker.failure()
+    return breaker
+
+
+def acquire_in_thread(breaker):
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (breaker.acquire(), acquired.set()), daemon=True)
+    thread.start()
+    return acquired
+
+
+def test_breaker_stays_closed_below_threshold():
+    breaker = CircuitBreaker('example.com', 3, 60)
+    for _ in range(2):
+        breaker.acquire()
+        breaker.failure()
+    started = time.monotonic()
+    breaker.acquire()
+    assert time.monotonic() - started < 0.1
+    breaker.success()
+    assert breaker.failures == 0
+
+
+def test_breaker_opens_and_lets_one_probe_through_after_cooldown():
+    breaker = open_breaker(0.2)
+    started = time.monotonic()
+    breaker.acquire()
+    assert time.monotonic() - started >= 0.15
+    assert breaker.probing
+    # everyone else waits for the probe
+    acquired = acquire_in_thread(breaker)
+    assert not acquired.wait(0.1)
+    breaker.success()
+    assert acquired.wait(1)
+    assert breaker.failures == 0 and not breaker.probing
+
+
+def test_breaker_reopens_when_the_probe_fails():
+    breaker = open_breaker(0.1)
+    breaker.acquire()
+    breaker.failure()
+    assert breaker.failures == 3 and not breaker.probing
+    assert breaker.open_until > time.monotonic() + 0.05
+
+
+def test_breaker_cancel_frees_the_probe_without_counting_a_failure():
+    breaker = open_breaker(0.05)
+    breaker.acquire()
+    breaker.cancel()
+    assert breaker.failures == 2 and not breaker.probing
+    started = time.monotonic()
+    breaker.acquire()
+    assert time.monotonic() - started < 0.1
+    assert breaker.probing
@@ -0,0 +1,49 @@
+import argparse
+from ctf_collect import watch
+from ctf_collect.metrics import Metrics, count_file, track_chall
+
+
+class Manifest:
+    def flush(self):
+        pass
+
+
+def run_watch(rounds: list, fail: dict, monkeypatch):
+    # rounds[i] is the challenge list of poll i, fail[i] the ids whose download fails in it
+    args = argparse.Namespace(metadata_cache=None, team_mirror=None, notify=None, watch=0, metrics=Metrics('gzctf'),
+                              metrics_file=None, manifest=Manifest())
+    downloads, notified = [], []
+    monkeypatch.setattr(watch, 'notify', lambda args, game, category, name, event: notified.append((name, event)))
+    poll = iter(range(len(rounds) + 1))
+
+    def list_challs():
+        number = next(poll)
+        if number == len(rounds):
+            raise KeyboardInterrupt
+        download_challs.number = number
+        return rounds[number]
+
+    def download_challs(objects):
+        downloads.append([object['id'] for object in objects])
+        for object in objects:
+            with track_chall(object['id']):
+                if object['id'] in fail.get(download_challs.number, ()):
+                    count_file(args, 'misc', 'failed')
+        return args.metrics.pop_failed_challs()
+
+    watch.watch_challs(args, 'game', list_challs, download_challs, lambda object: (object['id'], 'misc', object['name']))
+    return downloads, notified
+
+
+def test_failed_challenge_is_downloaded_again_but_notified_once(monkeypatch):
+    a, b = {'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}
+    downloads, notified = run_watch([[a], [a, b], [a, b], [a, b]], {1: {2}}, monkeypatch)
+    assert downloads == [[1], [2], [2]]
+    assert notified == [('b', 'released')]
+
+
+def test_changed_challenge_is_notified_as_updated(monkeypatch):
+    downloads, notified = run_watch([[{'id': 1, 'name': 'a', 'hint': ''}], [{'id': 1, 'name': 'a', 'hint': 'x', 'solves': 3}]], {}, monkeypatch)
+    assert downloads == [[1], [1]]
+    assert notified == [('a', 'updated')]
+